@@ -0,0 +1,65 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, status
+from app.core.config import settings
+from app.core.logger import get_logger
+from app.core.metrics import Histogram
+
+logger = get_logger("auth")
+
+#Dedicated executor for bcrypt work, so login storms cannot occupy the event loop or the shared threadpool.
+#A thread pool is enough: bcrypt releases the GIL while hashing, so workers run in parallel on separate cores.
+#Admission control: when workers + queue are full, new requests get 503 with Retry-After instead of piling up.
+class HashingPool:
+    def __init__(self, workers: int, max_queue: int, retry_after: int):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self.workers = workers
+        self.max_pending = workers + max_queue
+        self.retry_after = retry_after
+        self.pending = 0 #queued + running jobs (only touched from the event loop)
+        self.rejected = 0
+        self.hash_seconds = Histogram() #time spent hashing/verifying
+        self.queue_seconds = Histogram() #time spent waiting for a free worker
+
+    async def run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            logger.warning("Password hashing queue full (%s pending), shedding request", self.pending)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please retry shortly",
+                headers={"Retry-After": str(self.retry_after)}
+            )
+        submitted = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            self.queue_seconds.observe(started - submitted)
+            try:
+                return fn(*args)
+            finally:
+                self.hash_seconds.observe(time.perf_counter() - started)
+
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, timed)
+        finally:
+            self.pending -= 1
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "queue_depth": max(self.pending - self.workers, 0),
+            "rejected": self.rejected,
+            "hash_seconds": self.hash_seconds.snapshot(),
+            "queue_seconds": self.queue_seconds.snapshot(),
+        }
+
+hashing_pool = HashingPool(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+    retry_after=settings.PASSWORD_HASH_RETRY_AFTER_SECONDS,
+)
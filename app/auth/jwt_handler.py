@@ -2,7 +2,10 @@ from jose import jwt, JWTError
 from fastapi import Depends, HTTPException, status, Request
 from app.core.config import settings
 from datetime import datetime, timedelta, timezone
-from app.core.logger import logger  
+from app.core.logger import get_logger
+from app.auth.principal_cache import token_digest, get_principal, set_principal
+
+logger = get_logger("auth")
 
 SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = settings.ALGORITHM
@@ -11,38 +14,45 @@ ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
 
 # Accepts user data to encode into the token.
 def create_tokens(data: dict, expires_delta: timedelta = None):
-    logger.debug(f"Creating token for data: {data}")
+    logger.debug("Creating token for data: %s", data)
     
     to_encode = data.copy()
     if "sub" in to_encode and not isinstance(to_encode["sub"], str):
-        logger.debug(f"'sub' claim converted to string: {to_encode['sub']}")
+        logger.debug("'sub' claim converted to string: %s", to_encode['sub'])
         to_encode["sub"] = str(to_encode["sub"])
 
     expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": expire})
 
     token = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    logger.info(f"Token created successfully for sub: {to_encode.get('sub')}")
+    logger.info("Token created successfully for sub: %s", to_encode.get('sub'))
     
     return token
 
 # Accepts a JWT string and attempts to decode it.
+# Verified payloads are cached by token digest until the token expires, so repeat requests skip the HMAC check.
 def decode_token(token: str):
+    digest = token_digest(token)
+    payload = get_principal("claims", digest)
+    if payload is not None:
+        return payload
     logger.debug("Attempting to decode JWT token")
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         if "sub" in payload and not isinstance(payload["sub"], str):
             logger.debug("Converted 'sub' claim to string")
             payload["sub"] = str(payload["sub"])
-        logger.info(f"Token decoded successfully for sub: {payload.get('sub')}")
+        logger.debug("Token decoded successfully for sub: %s", payload.get('sub'))
+        set_principal("claims", digest, payload, payload.get("exp"))
         return payload
     except JWTError as e:
-        logger.error(f"[JWTError] Failed to decode token: {e}")
+        logger.error("[JWTError] Failed to decode token: %s", e)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
 
 
 # FastAPI dependency to extract and decode the token from the request.
-def get_current_user(request: Request):
+# The dependencies below are async (they do no I/O) so they run on the event loop instead of the threadpool.
+async def get_current_user(request: Request):
     logger.debug("Extracting Authorization header from request")
     auth_header = request.headers.get("Authorization")
     if not auth_header:
@@ -64,19 +74,22 @@ def get_current_user(request: Request):
 
 
 # Validates user and checks for admin role.
-def get_current_admin_user(request: Request):
+async def get_current_admin_user(request: Request):
     logger.debug("Checking if current user has admin privileges")
-    user = get_current_user(request)
+    user = await get_current_user(request)
     if user.get("role") != "admin":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
     
-    logger.info(f"Admin access granted for user: {user.get('sub')}")
+    logger.debug("Admin access granted for user: %s", user.get('sub'))
     return user
-def get_current_user_only(request: Request):
+async def get_current_user_only(request: Request):
     logger.debug("Checking if its a user")
-    user = get_current_user(request)
+    user = await get_current_user(request)
     if user.get("role") != "user":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="user privileges required")
-    user["id"] = user.get("id") or user.get("sub")
+    try:
+        user["id"] = int(user.get("id") or user.get("sub")) #asyncpg needs a real integer for user_id parameters
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid user ID in token")
     return user
    
@@ -0,0 +1,29 @@
+import hashlib
+import time
+from typing import Optional
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+#Cache of authenticated principals keyed by a SHA-256 digest of the bearer token (the raw token is never stored).
+#Two kinds of entries share it:
+#  ("claims", digest) -> verified JWT payload (skips signature verification in decode_token)
+#  ("user", digest)   -> {"id", "email", "role"} loaded from the users table (skips the SELECT in get_current_user)
+#Entries never outlive the token's exp claim, nor PRINCIPAL_CACHE_TTL_SECONDS (which bounds staleness across workers).
+principal_cache = TTLCache(maxsize=settings.PRINCIPAL_CACHE_MAXSIZE, ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS)
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def get_principal(kind: str, digest: str) -> Optional[dict]:
+    cached = principal_cache.get((kind, digest))
+    return dict(cached) if cached is not None else None #callers may modify the returned dict
+
+def set_principal(kind: str, digest: str, principal: dict, expires_at):
+    if expires_at is None:
+        return #tokens without exp are not cached
+    principal_cache.set((kind, digest), dict(principal), ttl=float(expires_at) - time.time())
+
+#Drops every cached principal of the user, e.g. after a password reset or a role change.
+def invalidate_user(user_id: int):
+    user_id = str(user_id)
+    principal_cache.invalidate_where(lambda key, principal: str(principal.get("id", principal.get("sub"))) == user_id)
@@ -1,27 +1,32 @@
 from fastapi import APIRouter, Depends, HTTPException, status #used for api routing , exception handling
-from sqlalchemy.orm import Session #for db operations
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession #for db operations
 from app.auth import schemas, models, utils
-from app.core.database import get_db
+from app.core.database import get_async_db
 from app.auth.jwt_handler import create_tokens #token creation
 from app.utils.token_utils import generate_reset_token, verify_reset_token #for password reset token generation and verification
-from app.utils.email_utils import send_reset_email
+from app.utils.email_utils import reset_email_content
+from app.notifications.outbox import enqueue_email, notify_sender
 from app.auth.models import User 
 from app.auth.schemas import ForgotPasswordRequest, ResetPasswordRequest
-from app.core.logger import logger
+from app.core.logger import get_logger
+from app.auth.principal_cache import invalidate_user
+
+logger = get_logger("auth")
 
 # Define an APIRouter for all auth-related routes with a common prefix and tag
 router = APIRouter(prefix="/auth", tags=["Auth"])
 #for registration
 @router.post("/signup", status_code=status.HTTP_201_CREATED)
-def signup(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    logger.debug(f"Attempting signup for email: {user.email}")
+async def signup(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    logger.debug("Attempting signup for email: %s", user.email)
     # Check if the user already exists
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
+    db_user = await db.scalar(select(models.User).where(models.User.email == user.email))
     if db_user:
-        logger.warning(f"Signup failed: Email already registered - {user.email}")
+        logger.warning("Signup failed: Email already registered - %s", user.email)
         raise HTTPException(status_code=400, detail="Email already registered")
-    # Hash the password securely
-    hashed_password = utils.hash_password(user.password)
+    # Hash the password securely (on the hashing pool; may answer 503 when it is saturated)
+    hashed_password = await utils.hash_password_async(user.password)
     # Create new user instance
     new_user = models.User(
         name=user.name,
@@ -31,37 +36,43 @@ def signup(user: schemas.UserCreate, db: Session = Depends(get_db)):
     )
     # Add and commit the new user to the database
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user) # Refresh to get the ID and other DB-generated fields
+    await db.commit()
+    await db.refresh(new_user) # Refresh to get the ID and other DB-generated fields
 
-    logger.info(f"User created successfully: {new_user.email} (ID: {new_user.id})")
+    logger.info("User created successfully: %s (ID: %s)", new_user.email, new_user.id)
     return {"message": "User created successfully"}
 
 #for login 
 @router.post("/signin")
-def signin(user: schemas.UserLogin, db: Session = Depends(get_db)):
-    logger.debug(f"Signin attempt for email: {user.email}")
+async def signin(user: schemas.UserLogin, db: AsyncSession = Depends(get_async_db)):
+    logger.debug("Signin attempt for email: %s", user.email)
      # Find user by email
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
+    db_user = await db.scalar(select(models.User).where(models.User.email == user.email))
 
 
     if not db_user:
-        logger.warning(f"Signin failed: Invalid email - {user.email}")
+        logger.warning("Signin failed: Invalid email - %s", user.email)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password"
     )
 
-    if not utils.verify_password(plain_password=user.password, hashed_password=db_user.password):
-        logger.warning(f"Signin failed: Incorrect password for {user.email}")
+    is_valid, new_hash = await utils.verify_and_update_password(user.password, db_user.password)
+    if not is_valid:
+        logger.warning("Signin failed: Incorrect password for %s", user.email)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password"
     )
+    # Transparently upgrade hashes made with an older bcrypt cost
+    if new_hash:
+        db_user.password = new_hash
+        await db.commit()
+        logger.info("Password hash upgraded to the current cost for user ID %s", db_user.id)
 
     # Generate JWT token with user ID and role
     access_token = create_tokens({"sub": str(db_user.id), "role": db_user.role})
-    logger.info(f"Signin successful for user: {user.email} (ID: {db_user.id})")
+    logger.info("Signin successful for user: %s (ID: %s)", user.email, db_user.id)
 
     return {
         "access_token": access_token,
@@ -70,33 +81,37 @@ def signin(user: schemas.UserLogin, db: Session = Depends(get_db)):
 
 #for getting a mail to reset password
 @router.post("/forgot-password")
-def forgot_password(data: ForgotPasswordRequest, db: Session = Depends(get_db)):
-    logger.debug(f"Password reset requested for email: {data.email}")
+async def forgot_password(data: ForgotPasswordRequest, db: AsyncSession = Depends(get_async_db)):
+    logger.debug("Password reset requested for email: %s", data.email)
      # search for user by email
-    user = db.query(User).filter(User.email == data.email).first()
+    user = await db.scalar(select(User).where(User.email == data.email))
     if not user:
-        logger.warning(f"Password reset failed: User not found - {data.email}")
+        logger.warning("Password reset failed: User not found - %s", data.email)
         raise HTTPException(status_code=404, detail="User not found")
     # Generate secure token for password reset present in email
     token = generate_reset_token(user.email)
-    # Send reset email
-    send_reset_email(user.email, token)
-    logger.info(f"Password reset email sent to: {user.email}")
+    # Queue the reset email; the background sender delivers it (with retries) after the response is sent
+    subject, body = reset_email_content(token)
+    enqueue_email(db, user.email, subject, body)
+    await db.commit()
+    notify_sender()
+    logger.info("Password reset email queued for: %s", user.email)
     return {"message": "Reset link sent to your email"}
 
 #resetting password using tokens
 @router.post("/reset-password")
-def reset_password(data: ResetPasswordRequest, db: Session = Depends(get_db)):
-    logger.debug(f"Attempting password reset using token: {data.token}")
+async def reset_password(data: ResetPasswordRequest, db: AsyncSession = Depends(get_async_db)):
+    logger.debug("Attempting password reset using token: %s", data.token)
     # Validate the token and extract email
     email = verify_reset_token(data.token)
     # Find the user with the provided email
-    user = db.query(User).filter(User.email == email).first()
+    user = await db.scalar(select(User).where(User.email == email))
     if not user:
-        logger.warning(f"Password reset failed: User not found for email {email}")
+        logger.warning("Password reset failed: User not found for email %s", email)
         raise HTTPException(status_code=404, detail="User not found")
-    # Update the user's password
-    user.password = utils.hash_password(data.new_password)
-    db.commit()
-    logger.info(f"Password reset successful for user: {email}")
+    # Update the user's password (hashed on the hashing pool)
+    user.password = await utils.hash_password_async(data.new_password)
+    await db.commit()
+    invalidate_user(user.id) #cached principals of this user are re-validated on their next request
+    logger.info("Password reset successful for user: %s", email)
     return {"message": "Password has been reset successfully"}
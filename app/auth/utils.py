@@ -1,13 +1,24 @@
 from fastapi import HTTPException, status, Request, Depends
 from passlib.context import CryptContext #used to hash and verify passwords.
 from sqlalchemy.orm import Session
-from app.core.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_async_db
 from app.auth.jwt_handler import decode_token
+from app.auth.principal_cache import token_digest, get_principal, set_principal
 from app.auth import models  
 from jose import JWTError
-from app.core.logger import logger
+from app.core.logger import get_logger
+from app.core.config import settings
+from app.auth.hashing import hashing_pool
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logger = get_logger("auth")
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS #hashes with a lower cost are flagged for rehashing
+)
 #Uses bcrypt for secure password hashing.
 #deprecated="auto" ensures older algorithms can be updated transparently.
 def hash_password(password: str) -> str:
@@ -16,18 +27,26 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+#Async variants used by the request handlers: the bcrypt work runs on the bounded hashing pool.
+async def hash_password_async(password: str) -> str:
+    return await hashing_pool.run(pwd_context.hash, password)
+
+#Returns (is_valid, new_hash); new_hash is set when the stored hash uses an outdated cost and should be replaced.
+async def verify_and_update_password(plain_password: str, hashed_password: str):
+    return await hashing_pool.run(pwd_context.verify_and_update, plain_password, hashed_password)
+
 def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
 
 #This function gets the current authenticated user from the Authorization header.
 # It’s typically used as a dependency in protected routes.
-def get_current_user(
+async def get_current_user(
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     #Get Authorization header
     auth_header = request.headers.get("Authorization")
-    logger.debug(f"Authorization header received: {auth_header}")
+    logger.debug("Authorization header received: %s", auth_header)
     if not auth_header:
         logger.warning("Authorization header missing")
         raise HTTPException(
@@ -42,13 +61,19 @@ def get_current_user(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid Authorization header format"
         )
+    #Cached principal for this token: no JWT verification and no user query
+    digest = token_digest(token)
+    principal = get_principal("user", digest)
+    if principal is not None:
+        return principal
+
     #Decode JWT
     try:
-        logger.info("Decoding token")
+        logger.debug("Decoding token")
         payload = decode_token(token)
-        logger.debug(f"Token payload: {payload}")
+        logger.debug("Token payload: %s", payload)
     except JWTError as e:
-        logger.error(f"Token decoding failed: {str(e)}")
+        logger.error("Token decoding failed: %s", str(e))
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired token"
@@ -71,12 +96,14 @@ def get_current_user(
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid user ID in token")
 
     # Query the User
-    logger.debug(f"Querying user with ID: {user_id}")
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    logger.debug("Querying user with ID: %s", user_id)
+    user = await db.get(models.User, user_id)
     if user is None:
-        logger.warning(f"User not found with ID: {user_id}")
+        logger.warning("User not found with ID: %s", user_id)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
 
-    # Return User Info
-    logger.info(f"Authenticated user: {user.email} (ID: {user.id})")
-    return {"id": user.id, "email": user.email, "role": user.role}
\ No newline at end of file
+    # Return User Info (cached until the token expires)
+    logger.debug("Authenticated user: %s (ID: %s)", user.email, user.id)
+    principal = {"id": user.id, "email": user.email, "role": user.role}
+    set_principal("user", digest, principal, payload.get("exp"))
+    return principal
\ No newline at end of file
@@ -1,6 +1,9 @@
-from sqlalchemy import Column, Integer, ForeignKey
+from sqlalchemy import Column, Integer, ForeignKey, DateTime, UniqueConstraint, Index, text
 from sqlalchemy.orm import relationship
-from app.core.database import Base
+from app.core.database import Base, before_index_created
+from app.core.logger import get_logger
+
+logger = get_logger("cart")
 
 class CartItem(Base):
     __tablename__ = "cart_items"
@@ -11,5 +14,46 @@ class CartItem(Base):
     quantity = Column(Integer, nullable=False)
     # Defines a relationship with the Product table; allows access to product details from cart item
     product = relationship("Product", backref="cart_items", lazy="joined")
-    
-#lazy="joined" means:Load the related object in the same query using a SQL JOIN.
\ No newline at end of file
+
+    #One row per product in a user's cart; also the conflict target of the batch cart upsert.
+    #A unique index rather than a constraint, so init_db() can add it to an existing table.
+    __table_args__ = (Index("ux_cart_items_user_product", "user_id", "product_id", unique=True),)
+
+#Carts written before the unique index may hold several rows for one product: they are merged into the oldest row
+#(quantities summed) before init_db() creates the index. Runs in the init_db() transaction.
+@before_index_created("ux_cart_items_user_product")
+def _merge_duplicate_cart_items(conn):
+    duplicates = """
+        SELECT MIN(id) FROM cart_items
+        WHERE user_id IS NOT NULL AND product_id IS NOT NULL
+        GROUP BY user_id, product_id HAVING COUNT(*) > 1
+    """
+    conn.execute(text(f"""
+        UPDATE cart_items SET quantity = (
+            SELECT SUM(other.quantity) FROM cart_items other
+            WHERE other.user_id = cart_items.user_id AND other.product_id = cart_items.product_id
+        )
+        WHERE id IN ({duplicates})
+    """))
+    removed = conn.execute(text("""
+        DELETE FROM cart_items
+        WHERE user_id IS NOT NULL AND product_id IS NOT NULL
+          AND id NOT IN (SELECT MIN(id) FROM cart_items WHERE user_id IS NOT NULL AND product_id IS NOT NULL GROUP BY user_id, product_id)
+    """)).rowcount
+    if removed:
+        logger.warning("Merged %s duplicate cart rows before creating ux_cart_items_user_product", removed)
+
+#lazy="joined" means:Load the related object in the same query using a SQL JOIN.
+
+#A time-limited hold on product stock, placed when an item is added to the cart.
+#Its quantity is mirrored in Product.reserved; checkout converts it into a sale, the sweeper releases it once expired.
+class StockReservation(Base):
+    __tablename__ = "stock_reservations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True) #the sweeper scans by expiry
+
+    __table_args__ = (UniqueConstraint("user_id", "product_id", name="uq_stock_reservations_user_product"),)
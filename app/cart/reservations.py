@@ -0,0 +1,146 @@
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from fastapi import HTTPException
+from sqlalchemy import select, update, delete, case, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.cart.models import StockReservation
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, dialect_insert
+from app.core.logger import get_logger
+from app.products.events import stock_changed
+from app.products.models import Product
+
+logger = get_logger("cart")
+
+#Stock reservations ("holds"): a user's hold on a product always matches the quantity in their cart.
+#Product.reserved is the sum of all holds on the product, so available stock is stock - reserved.
+
+def _expiry() -> datetime:
+    return datetime.now(timezone.utc) + timedelta(seconds=settings.RESERVATION_TTL_SECONDS)
+
+#Sets the user's hold on a product to quantity (0 releases it) and renews its expiry.
+#Runs inside the caller's transaction; raises a 400 when the extra units are not available
+#and a 404 when the product does not exist.
+async def set_hold(db: AsyncSession, user_id: int, product_id: int, quantity: int):
+    hold = await db.scalar(
+        select(StockReservation).filter_by(user_id=user_id, product_id=product_id).with_for_update()
+    )
+    held = hold.quantity if hold else 0
+    delta = quantity - held
+
+    if delta > 0:
+        #only succeeds while enough unreserved stock is left; the row lock makes concurrent holds queue up
+        result = await db.execute(
+            update(Product)
+            .where(Product.id == product_id, Product.stock - Product.reserved >= delta)
+            .values(reserved=Product.reserved + delta)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            row = (await db.execute(select(Product.stock, Product.reserved).where(Product.id == product_id))).first()
+            if row is None:
+                raise HTTPException(status_code=404, detail="Product not found")
+            left = max(row.stock - row.reserved, 0)
+            if left <= 0:
+                raise HTTPException(status_code=400, detail="Product is out of stock")
+            raise HTTPException(
+                status_code=400,
+                detail=f"Cannot add {delta} items to cart. Only {left} left in stock."
+            )
+    elif delta < 0:
+        await db.execute(
+            update(Product)
+            .where(Product.id == product_id)
+            .values(reserved=Product.reserved + delta)
+            .execution_options(synchronize_session=False)
+        )
+
+    if quantity <= 0:
+        if hold:
+            await db.delete(hold)
+    elif hold:
+        hold.quantity = quantity
+        hold.expires_at = _expiry()
+    else:
+        db.add(StockReservation(user_id=user_id, product_id=product_id, quantity=quantity, expires_at=_expiry()))
+
+#Batch form of set_hold for target quantities above zero ({product_id: quantity}); held has the current holds.
+#One conditional UPDATE applies the differences of all products at once, then one multi-row upsert writes the holds.
+#Only increases need unreserved stock: lowering a hold always succeeds, even when stock was cut below reserved.
+#Returns the ids whose hold was set; the others no longer have enough unreserved stock (concurrent holds).
+async def set_holds(db: AsyncSession, user_id: int, quantities: dict, held: dict) -> set:
+    deltas = {product_id: quantity - held.get(product_id, 0) for product_id, quantity in quantities.items()}
+    changing = {product_id: delta for product_id, delta in deltas.items() if delta}
+    applied = set(quantities) - set(changing)
+    if changing:
+        delta = case(changing, value=Product.id)
+        result = await db.execute(
+            update(Product)
+            .where(Product.id.in_(changing), or_(delta <= 0, Product.stock - Product.reserved >= delta))
+            .values(reserved=Product.reserved + delta)
+            .returning(Product.id)
+            .execution_options(synchronize_session=False)
+        )
+        applied.update(result.scalars().all())
+    if applied:
+        expires_at = _expiry()
+        statement = dialect_insert(db, StockReservation).values([
+            {"user_id": user_id, "product_id": product_id, "quantity": quantities[product_id], "expires_at": expires_at}
+            for product_id in applied
+        ])
+        await db.execute(statement.on_conflict_do_update(
+            index_elements=[StockReservation.user_id, StockReservation.product_id],
+            set_={"quantity": statement.excluded.quantity, "expires_at": statement.excluded.expires_at},
+        ))
+    return applied
+
+#Locks and returns the user's holds as {product_id: quantity}, for checkout to convert into a sale.
+#The lock keeps the sweeper (which skips locked rows) from releasing them mid-checkout.
+async def lock_holds(db: AsyncSession, user_id: int) -> dict:
+    rows = (await db.execute(
+        select(StockReservation.product_id, StockReservation.quantity)
+        .where(StockReservation.user_id == user_id)
+        .with_for_update()
+    )).all()
+    return {row.product_id: row.quantity for row in rows}
+
+#Gives units back to available stock ({product_id: quantity}), e.g. for holds that are dropped without a sale.
+async def release_reserved(db: AsyncSession, quantities: dict):
+    await db.execute(
+        update(Product)
+        .where(Product.id.in_(quantities))
+        .values(reserved=Product.reserved - case(quantities, value=Product.id))
+        .execution_options(synchronize_session=False)
+    )
+
+async def delete_holds(db: AsyncSession, user_id: int):
+    await db.execute(delete(StockReservation).where(StockReservation.user_id == user_id))
+
+#Background job: releases expired holds in batches (one short transaction per batch).
+async def release_expired_reservations():
+    batch_size = settings.RESERVATION_SWEEP_BATCH_SIZE
+    released = 0
+    async with AsyncSessionLocal() as db:
+        while True:
+            expired = (await db.execute(
+                select(StockReservation.id, StockReservation.product_id, StockReservation.quantity)
+                .where(StockReservation.expires_at <= datetime.now(timezone.utc))
+                .order_by(StockReservation.id)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True) #rows being converted by a checkout are left alone
+            )).all()
+            if not expired:
+                break
+
+            totals = defaultdict(int)
+            for row in expired:
+                totals[row.product_id] += row.quantity
+            await release_reserved(db, totals)
+            await db.execute(delete(StockReservation).where(StockReservation.id.in_([row.id for row in expired])))
+            await db.commit()
+            stock_changed(totals) #available stock went up
+            released += len(expired)
+            if len(expired) < batch_size:
+                break
+    if released:
+        logger.info("Released %s expired stock reservations", released)
@@ -1,81 +1,141 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from app.cart.schemas import CartAddRequest, CartUpdateRequest, CartItemOut
-from app.cart.models import CartItem
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import select, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.cart.schemas import CartAddRequest, CartUpdateRequest, CartItemOut, CartBatchRequest, CartBatchLineResult
+from app.cart.models import CartItem, StockReservation
+from app.cart.reservations import set_hold, set_holds
 from app.products.models import Product
-from app.core.database import get_db
+from app.products.events import stock_changed
+from app.core.database import get_async_db, dialect_insert
+from app.core.config import settings
+from app.core.replicas import read_router
 from typing import List
 from app.auth.jwt_handler import get_current_user_only 
-from app.core.logger import logger
+from app.core.logger import get_logger
+from app.utils.serialization import json_response, cart_item_out
+
+logger = get_logger("cart")
+
 router = APIRouter(prefix="/cart", tags=["Cart"])
 
 @router.post("/", response_model=CartItemOut, status_code=status.HTTP_201_CREATED)
-def add_to_cart(
+async def add_to_cart(
     request: CartAddRequest,
-    db: Session = Depends(get_db),
+    http_request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user_only)
 ):
-    logger.info(f"Add to cart request by user {current_user['id']} for product {request.product_id}")
+    logger.debug("Add to cart request by user %s for product %s", current_user['id'], request.product_id)
 
     # Validate requested quantity
     if request.quantity <= 0:
         raise HTTPException(status_code=400, detail="Quantity must be greater than zero")
 
-    # Check if product exists
-    product = db.query(Product).filter(Product.id == request.product_id).first()
-    if not product:
+    # 404 up front: on PostgreSQL the upsert below would otherwise fail on the foreign key
+    if await db.scalar(select(Product.id).where(Product.id == request.product_id)) is None:
         raise HTTPException(status_code=404, detail="Product not found")
 
-    # Check if product is out of stock
-    if product.stock <= 0:
-        raise HTTPException(status_code=400, detail="Product is out of stock")
-
-    # Check existing cart item
-    cart_item = db.query(CartItem).filter_by(
+    # Add to the cart line with one upsert, like /cart/batch. The first write of the transaction locks the line, so
+    # concurrent adds of the same product (even the first ones) queue up here instead of racing on a read.
+    statement = dialect_insert(db, CartItem).values(
         user_id=current_user["id"],
-        product_id=request.product_id
-    ).first()
-
-    # Total intended quantity (new + existing)
-    existing_quantity = cart_item.quantity if cart_item else 0
-    total_requested_quantity = existing_quantity + request.quantity
-
-    # Ensure total requested does not exceed available stock
-    if total_requested_quantity > product.stock:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Cannot add {request.quantity} items to cart. Only {product.stock - existing_quantity} left in stock."
-        )
-
-    # Update or create cart item
-    if cart_item:
-        cart_item.quantity = total_requested_quantity
-        logger.info(f"Updated cart item quantity for user {current_user['id']}")
-    else:
-        cart_item = CartItem(
-            user_id=current_user["id"],
-            product_id=request.product_id,
-            quantity=request.quantity
-        )
-        logger.info(f"Added new item to cart for user {current_user['id']}")
-
-    db.add(cart_item)
-    db.commit()
-    db.refresh(cart_item)
-    logger.debug(f"Cart item saved: {cart_item}")
+        product_id=request.product_id,
+        quantity=request.quantity
+    )
+    total_requested_quantity = await db.scalar(statement.on_conflict_do_update(
+        index_elements=[CartItem.user_id, CartItem.product_id],
+        set_={"quantity": CartItem.quantity + statement.excluded.quantity},
+    ).returning(CartItem.quantity))
+
+    # Hold the stock for the new total; fails with 400 if not enough unreserved stock is left, which rolls the
+    # cart line back too. Stock gates the purchase, so this is checked against the database.
+    await set_hold(db, current_user["id"], request.product_id, total_requested_quantity)
+    await db.commit()
+    logger.info("Cart quantity of product %s for user %s is now %s", request.product_id, current_user['id'], total_requested_quantity)
+
+    stock_changed([request.product_id]) #available stock changed
+    read_router.pin_to_primary(http_request, response) #the product pages must show the held stock right away
+    cart_item = await db.scalar(select(CartItem).filter_by(user_id=current_user["id"], product_id=request.product_id))
+    logger.debug("Cart item saved: %s", cart_item)
     return cart_item
 
 
+#Many (product_id, quantity) lines in one call, e.g. "buy again" from an order or restoring a saved cart.
+#One query reads stock, cart and holds for all products; one UPDATE reserves the stock; one multi-row upsert writes
+#the cart lines. Lines are applied independently: the result says per line whether it was applied, and why not.
+@router.post("/batch", response_model=List[CartBatchLineResult])
+async def add_to_cart_batch(
+    request: CartBatchRequest,
+    http_request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(get_current_user_only)
+):
+    user_id = current_user["id"]
+    if not request.items or len(request.items) > settings.CART_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Send between 1 and {settings.CART_BATCH_MAX_ITEMS} items")
+    logger.debug("Batch cart request by user %s with %s lines (%s)", user_id, len(request.items), request.mode)
+
+    rows = await db.execute(
+        select(Product.id, Product.stock, Product.reserved, CartItem.quantity.label("in_cart"), StockReservation.quantity.label("held"))
+        .outerjoin(CartItem, and_(CartItem.product_id == Product.id, CartItem.user_id == user_id))
+        .outerjoin(StockReservation, and_(StockReservation.product_id == Product.id, StockReservation.user_id == user_id))
+        .where(Product.id.in_({line.product_id for line in request.items}))
+    )
+    current = {row.id: row for row in rows}
+
+    results = [CartBatchLineResult(product_id=line.product_id, ok=False) for line in request.items]
+    targets, held = {}, {}
+    for line, result in zip(request.items, results):
+        row = current.get(line.product_id)
+        if line.quantity <= 0:
+            result.error = "Quantity must be greater than zero"
+        elif row is None:
+            result.error = "Product not found"
+        elif line.product_id in targets or line.product_id in held:
+            result.error = "Duplicate product_id in request"
+        else:
+            held[line.product_id] = row.held or 0
+            target = (row.in_cart or 0) + line.quantity if request.mode == "add" else line.quantity
+            left = max(row.stock - row.reserved, 0)
+            if target - held[line.product_id] > left: #same checks and messages as set_hold
+                result.error = "Product is out of stock" if left <= 0 else f"Cannot add {line.quantity} items to cart. Only {left} left in stock."
+            else:
+                targets[line.product_id] = target
+
+    applied = await set_holds(db, user_id, targets, held) if targets else set()
+    if applied:
+        statement = dialect_insert(db, CartItem).values([
+            {"user_id": user_id, "product_id": product_id, "quantity": targets[product_id]} for product_id in applied
+        ])
+        await db.execute(statement.on_conflict_do_update(
+            index_elements=[CartItem.user_id, CartItem.product_id],
+            set_={"quantity": statement.excluded.quantity},
+        ))
+    await db.commit()
+    stock_changed(product_id for product_id in applied if targets[product_id] != held[product_id]) #available stock changed
+    if applied:
+        read_router.pin_to_primary(http_request, response)
+
+    for result in results:
+        if result.error is None and result.product_id in applied:
+            result.ok, result.quantity = True, targets[result.product_id]
+        elif result.error is None:
+            result.error = "Not enough stock left" #taken by a concurrent hold between the read and the update
+    logger.info("Batch cart update for user %s: %s of %s lines applied", user_id, len(applied), len(request.items))
+    return results
+
 @router.get("/", response_model=List[CartItemOut])
-def view_cart(db: Session = Depends(get_db), current_user: dict = Depends(get_current_user_only)):
-    logger.info(f"Fetching cart items for user {current_user['id']}")
-    items = db.query(CartItem).filter(CartItem.user_id == current_user["id"]).all()
-    return items
+async def view_cart(db: AsyncSession = Depends(get_async_db), current_user: dict = Depends(get_current_user_only)):
+    logger.debug("Fetching cart items for user %s", current_user['id'])
+    items = (await db.execute(select(CartItem).where(CartItem.user_id == current_user["id"]))).scalars().unique().all()
+    return json_response([cart_item_out(item) for item in items]) #shaped as CartItemOut, no second validation pass
 
 @router.put("/{product_id}", response_model=CartItemOut)
-def update_cart(product_id: int, request: CartUpdateRequest, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user_only)):
-    logger.info(f"Update request by user {current_user['id']} for product {product_id}")
-    cart_item = db.query(CartItem).filter_by(user_id=current_user["id"], product_id=product_id).first()
+async def update_cart(product_id: int, request: CartUpdateRequest, http_request: Request, response: Response, db: AsyncSession = Depends(get_async_db), current_user: dict = Depends(get_current_user_only)):
+    logger.debug("Update request by user %s for product %s", current_user['id'], product_id)
+    cart_item = await db.scalar(select(CartItem).filter_by(user_id=current_user["id"], product_id=product_id))
     if not cart_item:
         raise HTTPException(status_code=404, detail="Item not found in cart")
 
@@ -84,20 +144,26 @@ def update_cart(product_id: int, request: CartUpdateRequest, db: Session = Depen
         raise HTTPException(status_code=400, detail="Quantity must be greater than zero")
 
 
+    await set_hold(db, current_user["id"], product_id, request.quantity)
     cart_item.quantity = request.quantity
-    db.commit()
-    db.refresh(cart_item)
-    logger.info(f"Cart item updated: {cart_item}")
+    await db.commit()
+    stock_changed([product_id])
+    read_router.pin_to_primary(http_request, response)
+    await db.refresh(cart_item)
+    logger.info("Cart item updated: %s", cart_item)
     return cart_item
 
 @router.delete("/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
-def remove_from_cart(product_id: int, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user_only)):
-    logger.info(f"Delete request by user {current_user['id']} for product {product_id}")
-    cart_item = db.query(CartItem).filter_by(user_id=current_user["id"], product_id=product_id).first()
+async def remove_from_cart(product_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_async_db), current_user: dict = Depends(get_current_user_only)):
+    logger.debug("Delete request by user %s for product %s", current_user['id'], product_id)
+    cart_item = await db.scalar(select(CartItem).filter_by(user_id=current_user["id"], product_id=product_id))
     if not cart_item:
-        logger.warning(f"Cart item not found for user {current_user['id']} and product {product_id}")
+        logger.warning("Cart item not found for user %s and product %s", current_user['id'], product_id)
         raise HTTPException(status_code=404, detail="Item not found in cart")
 
-    db.delete(cart_item)
-    db.commit()
-    logger.info(f"Cart item deleted for user {current_user['id']} and product {product_id}")
\ No newline at end of file
+    await set_hold(db, current_user["id"], product_id, 0) #releases the reserved stock
+    await db.delete(cart_item)
+    await db.commit()
+    stock_changed([product_id])
+    read_router.pin_to_primary(request, response)
+    logger.info("Cart item deleted for user %s and product %s", current_user['id'], product_id)
\ No newline at end of file
@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from typing import List, Literal, Optional
 
 class CartAddRequest(BaseModel):
     product_id: int
@@ -25,3 +26,19 @@ class CartItemOut(BaseModel):
     model_config = {
         "from_attributes": True
     }
+
+class CartBatchLine(BaseModel):
+    product_id: int
+    quantity: int
+
+#mode "add" adds each quantity to what is already in the cart (e.g. "buy again"); "set" replaces it (e.g. restoring a saved cart).
+class CartBatchRequest(BaseModel):
+    items: List[CartBatchLine]
+    mode: Literal["add", "set"] = "add"
+
+#Outcome of one line: quantity is the resulting cart quantity when ok, error says why the line was not applied.
+class CartBatchLineResult(BaseModel):
+    product_id: int
+    ok: bool
+    quantity: Optional[int] = None
+    error: Optional[str] = None
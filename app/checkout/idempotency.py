@@ -0,0 +1,145 @@
+import asyncio
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import select, update, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.checkout.models import IdempotencyKey
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.logger import get_logger
+
+logger = get_logger("checkout")
+
+IN_PROGRESS = "in_progress"
+COMPLETED = "completed"
+POLL_INTERVAL_SECONDS = 0.1 #how often a duplicate request re-checks a key claimed by another worker
+
+#Completed responses, so most retries are answered without a database round-trip.
+_completed = TTLCache(maxsize=settings.IDEMPOTENCY_CACHE_MAXSIZE, ttl=settings.IDEMPOTENCY_KEY_TTL_SECONDS)
+#Attempts running in this worker; duplicates arriving here wait on the event instead of polling.
+_in_flight = {}
+
+def request_fingerprint(*parts: str) -> str:
+    return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+def _replay(user_id: int, key: str, request_hash: str, stored_hash: str, code: int, body) -> Tuple[int, dict]:
+    if stored_hash != request_hash:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+    logger.info("Replaying stored checkout response for user %s (Idempotency-Key %s)", user_id, key)
+    return code, body
+
+#Claims the key for this attempt in its own short transaction.
+#Returns the stored (status code, body) when the key was already completed, or None when the caller should run the checkout.
+#A duplicate of an attempt that is still running waits for it (up to IDEMPOTENCY_WAIT_TIMEOUT_SECONDS) and then replays its result.
+async def begin(user_id: int, key: str, request_hash: str) -> Optional[Tuple[int, dict]]:
+    deadline = asyncio.get_running_loop().time() + settings.IDEMPOTENCY_WAIT_TIMEOUT_SECONDS
+    while True:
+        cached = _completed.get((user_id, key))
+        if cached:
+            return _replay(user_id, key, request_hash, *cached)
+
+        event = _in_flight.get((user_id, key))
+        if event is not None:
+            remaining = deadline - asyncio.get_running_loop().time()
+            try:
+                await asyncio.wait_for(event.wait(), timeout=max(remaining, 0))
+            except asyncio.TimeoutError:
+                raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still being processed")
+            continue
+
+        async with AsyncSessionLocal() as db:
+            now = datetime.now(timezone.utc)
+            db.add(IdempotencyKey(
+                user_id=user_id, key=key, request_hash=request_hash, status=IN_PROGRESS,
+                expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL_SECONDS)
+            ))
+            try:
+                await db.commit()
+                _in_flight[(user_id, key)] = asyncio.Event()
+                return None
+            except IntegrityError:
+                await db.rollback()
+
+            record = await db.scalar(select(IdempotencyKey).filter_by(user_id=user_id, key=key))
+            if record is None: #purged or abandoned in the meantime, try to claim it again
+                continue
+            if record.status == COMPLETED:
+                _completed.set((user_id, key), (record.request_hash, record.response_code, record.response_body))
+                return _replay(user_id, key, request_hash, record.request_hash, record.response_code, record.response_body)
+            claimed_at = record.created_at if record.created_at.tzinfo else record.created_at.replace(tzinfo=timezone.utc)
+            if claimed_at < now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT_SECONDS):
+                #the attempt holding the key died without finishing: drop its claim and retry
+                await db.execute(delete(IdempotencyKey).where(IdempotencyKey.id == record.id, IdempotencyKey.status == IN_PROGRESS))
+                await db.commit()
+                logger.warning("Took over stale Idempotency-Key %s of user %s", key, user_id)
+                continue
+
+        #in progress on another worker: poll until it completes or we give up
+        if asyncio.get_running_loop().time() >= deadline:
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still being processed")
+        await asyncio.sleep(POLL_INTERVAL_SECONDS)
+
+#Stores the final response in the checkout's own transaction, so it commits atomically with the order.
+async def store_response(db: AsyncSession, user_id: int, key: str, code: int, body: dict):
+    await db.execute(
+        update(IdempotencyKey)
+        .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+        .values(status=COMPLETED, response_code=code, response_body=body)
+    )
+
+#Called after the checkout transaction committed.
+def finish(user_id: int, key: str, request_hash: str, code: int, body: dict):
+    _completed.set((user_id, key), (request_hash, code, body))
+    event = _in_flight.pop((user_id, key), None)
+    if event:
+        event.set()
+
+#Called when the checkout ended in a final client error (4xx): stores it in its own transaction, so a retry
+#with the same key gets the same answer instead of running the checkout again.
+async def complete(user_id: int, key: str, request_hash: str, code: int, body: dict):
+    try:
+        async with AsyncSessionLocal() as db:
+            await store_response(db, user_id, key, code, body)
+            await db.commit()
+    except BaseException:
+        await abandon(user_id, key)
+        raise
+    finish(user_id, key, request_hash, code, body)
+
+#Called when the checkout failed: releases the key so a retry runs the checkout again.
+async def abandon(user_id: int, key: str):
+    try:
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(IdempotencyKey).where(
+                IdempotencyKey.user_id == user_id, IdempotencyKey.key == key, IdempotencyKey.status == IN_PROGRESS
+            ))
+            await db.commit()
+    finally:
+        event = _in_flight.pop((user_id, key), None)
+        if event:
+            event.set()
+
+#Background job: deletes expired keys in batches.
+async def purge_expired_keys():
+    batch_size = settings.IDEMPOTENCY_PURGE_BATCH_SIZE
+    purged = 0
+    async with AsyncSessionLocal() as db:
+        while True:
+            ids = (await db.execute(
+                select(IdempotencyKey.id)
+                .where(IdempotencyKey.expires_at <= datetime.now(timezone.utc))
+                .limit(batch_size)
+            )).scalars().all()
+            if not ids:
+                break
+            await db.execute(delete(IdempotencyKey).where(IdempotencyKey.id.in_(ids)))
+            await db.commit()
+            purged += len(ids)
+            if len(ids) < batch_size:
+                break
+    if purged:
+        logger.info("Purged %s expired idempotency keys", purged)
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, JSON, UniqueConstraint, func
+from app.core.database import Base
+
+#Idempotency-Key records for POST /checkout: the first request with a key claims it ("in_progress"),
+#and the final response is stored with it ("completed") so that retries replay it instead of placing another order.
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    key = Column(String(255), nullable=False)
+    request_hash = Column(String(64), nullable=False) #a key may only be reused for the same request body
+    status = Column(String, nullable=False)
+    response_code = Column(Integer)
+    response_body = Column(JSON)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True) #the purge job scans by expiry
+
+    __table_args__ = (UniqueConstraint("user_id", "key", name="uq_idempotency_keys_user_key"),)
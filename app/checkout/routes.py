@@ -1,92 +1,148 @@
-from fastapi import APIRouter, Depends, HTTPException,Request
-from sqlalchemy.orm import Session
-from app.core.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, Header
+from fastapi.responses import JSONResponse
+from typing import Optional
+from sqlalchemy import select, insert, update, delete, case, literal
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_async_db
 from app.auth.utils import get_current_user
-from app.auth import models as auth_models
-from app.cart import models as cart_models
-from app.orders import models as order_models
-from app.products import models as product_models
+from app.cart.models import CartItem
+from app.cart.reservations import lock_holds, release_reserved, delete_holds
+from app.orders.models import Order, OrderItem
+from app.products.models import Product
+from app.products.events import stock_changed
+from app.core.replicas import read_router
 from app.orders.schemas import CheckoutRequest
-from app.core.logger import logger 
+from app.checkout import idempotency
+from app.core.error_handler import http_exception_content
+from app.core.logger import get_logger
+
+logger = get_logger("checkout")
 
 router = APIRouter(prefix="/checkout", tags=["Checkout"])
 
-@router.post("/", status_code=201)
-def dummy_checkout(
-    request_data: CheckoutRequest,
-    request: Request,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user)
-):
+#Places the order in one transaction: read the cart with its products, decrement all stock with one conditional
+#UPDATE (converting the user's stock reservations), insert the order and all its items, clear the cart, commit.
+#Any shortfall rolls everything back.
+async def _place_order(db: AsyncSession, user_id: int, request_data: CheckoutRequest, idempotency_key: Optional[str]) -> dict:
+    #Fetching Cart Items (only with quantity > 0) together with their product price in one query
+    cart_lines = (await db.execute(
+        select(CartItem.product_id, CartItem.quantity, Product.price)
+        .join(Product, Product.id == CartItem.product_id)
+        .where(CartItem.user_id == user_id, CartItem.quantity > 0)
+    )).all()
 
-    #checking the role
-    if current_user["role"] != "user":
-        raise HTTPException(status_code=403, detail="Only users can perform checkout")
-    logger.info(f"Checkout initiated by user ID {current_user['id']}")
-
-    #Fetching the User
-    user = db.query(auth_models.User).filter(auth_models.User.id == current_user["id"]).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    #Fetching Cart Items
-    # Fetching Cart Items (only with quantity > 0)
-    cart_items = db.query(cart_models.CartItem).filter(
-        cart_models.CartItem.user_id == user.id,
-        cart_models.CartItem.quantity > 0
-        ).all()
-
-    if not cart_items:
+    if not cart_lines:
         raise HTTPException(status_code=400, detail="Cart is empty or has invalid items")
 
-    # Log problematic items for debugging
-    for item in cart_items:
-        if item.quantity <= 0:
-            logger.warning(f"Cart contains item with zero or negative quantity: product_id={item.product_id}")
-
     # Calculate Total Price
-    total_price = sum(item.quantity * item.product.price for item in cart_items)
+    total_price = sum(line.quantity * line.price for line in cart_lines)
 
     if total_price <= 0:
         raise HTTPException(status_code=400, detail="Invalid total price. Cannot proceed with checkout.")
 
-    logger.info(f"Total price for checkout: INR {total_price}")
+    logger.info("Total price for checkout: INR %s", total_price)
+
+    #Update product stock: one statement for all products, and each row only if it still has enough stock.
+    #Units the user holds are converted (stock and reserved both drop); anything beyond the hold must come from
+    #stock nobody else has reserved. The row locks taken by the UPDATE serialize concurrent buyers.
+    quantities = {line.product_id: line.quantity for line in cart_lines}
+    holds = await lock_holds(db, user_id)
+    requested = case(quantities, value=Product.id)
+    held = case(holds, value=Product.id, else_=0) if holds else literal(0)
+    result = await db.execute(
+        update(Product)
+        .where(Product.id.in_(quantities), Product.stock - Product.reserved + held >= requested)
+        .values(stock=Product.stock - requested, reserved=Product.reserved - held)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != len(quantities):
+        await db.rollback()
+        short = (await db.execute(
+            select(Product.name).where(Product.id.in_(quantities), Product.stock - Product.reserved + held < requested)
+        )).scalars().all()
+        logger.warning("Checkout aborted for user ID %s: not enough stock for %s", user_id, short)
+        raise HTTPException(status_code=400, detail=f"Not enough stock for product(s): {', '.join(short) or 'some cart items'}")
 
-    #create order
-    order = order_models.Order(
-        user_id=user.id,
+    #create order (flush assigns its id without committing)
+    order = Order(
+        user_id=user_id,
         total_price=total_price,
         status=request_data.status
-
     )
-    
     db.add(order)
-    db.commit()
-    db.refresh(order)
-
-    logger.info(f"Order created with ID {order.id} for user ID {user.id}")
-    
-    for item in cart_items:
-        order_item = order_models.OrderItem(
-        order_id=order.id,
-        product_id=item.product_id,
-        quantity=item.quantity,
-        price_per_unit=item.product.price
-    )
-    db.add(order_item)
-
-    # Update product stock
-    product = db.query(product_models.Product).filter(product_models.Product.id == item.product_id).first()
-    if product:
-        if product.stock < item.quantity:
-            raise HTTPException(status_code=400, detail=f"Not enough stock for product '{product.name}'")
-        product.stock -= item.quantity
-        logger.info(f"Updated stock for product ID {product.id}: {product.stock}")
-    else:
-        logger.warning(f"Product ID {item.product_id} not found while updating stock")
-
-    #Clear Cart
-    db.query(cart_models.CartItem).filter(cart_models.CartItem.user_id == user.id).delete()
-    db.commit()
-
-    return {"message": " Order created.Successfully", "order_id": order.id}
+    await db.flush()
+
+    #Insert all order items in one batch
+    await db.execute(insert(OrderItem), [
+        {
+            "order_id": order.id,
+            "product_id": line.product_id,
+            "quantity": line.quantity,
+            "price_per_unit": line.price,
+        }
+        for line in cart_lines
+    ])
+
+    #Clear Cart and its reservations: holds on ordered products were converted above, any other hold
+    #(e.g. left behind by a cart line that is no longer there) goes back to available stock
+    released = {product_id: quantity for product_id, quantity in holds.items() if product_id not in quantities}
+    if released:
+        await release_reserved(db, released)
+    await db.execute(delete(CartItem).where(CartItem.user_id == user_id))
+    await delete_holds(db, user_id)
+    response_body = {"message": " Order created.Successfully", "order_id": order.id}
+    if idempotency_key:
+        await idempotency.store_response(db, user_id, idempotency_key, 201, response_body) #commits together with the order
+    await db.commit()
+    logger.info("Order created with ID %s for user ID %s (%s items)", order.id, user_id, len(cart_lines))
+    stock_changed({**quantities, **released}) #stock changed, refresh the stock of cached snapshots
+
+    return response_body
+
+#Clients may send an Idempotency-Key header: a retry with the same key returns the stored response of the first attempt
+#(marked with Idempotent-Replayed: true) instead of placing a second order. Client errors (4xx, e.g. an empty cart or
+#not enough stock) are final and stored too; server errors release the key so a retry runs the checkout again.
+@router.post("/", status_code=201)
+async def dummy_checkout(
+    request_data: CheckoutRequest,
+    request: Request,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(get_current_user) #already verifies that the user exists
+):
+
+    #checking the role
+    if current_user["role"] != "user":
+        raise HTTPException(status_code=403, detail="Only users can perform checkout")
+    user_id = current_user["id"]
+    logger.info("Checkout initiated by user ID %s", user_id)
+
+    if not idempotency_key:
+        response_body = await _place_order(db, user_id, request_data, None)
+        read_router.pin_to_primary(request, response) #the new order must show up in the order history right away
+        return response_body
+
+    fingerprint = idempotency.request_fingerprint(request.url.path, request_data.model_dump_json())
+    stored = await idempotency.begin(user_id, idempotency_key, fingerprint)
+    if stored:
+        code, body = stored
+        replay = JSONResponse(status_code=code, content=body, headers={"Idempotent-Replayed": "true"})
+        if code < 400:
+            read_router.pin_to_primary(request, replay) #a retry may be the first response the client sees
+        return replay
+    try:
+        response_body = await _place_order(db, user_id, request_data, idempotency_key)
+    except HTTPException as e:
+        if not 400 <= e.status_code < 500:
+            await idempotency.abandon(user_id, idempotency_key)
+            raise
+        await db.rollback() #ends the checkout's read transaction before the key is written in its own
+        await idempotency.complete(user_id, idempotency_key, fingerprint, e.status_code, http_exception_content(e))
+        raise
+    except BaseException:
+        await idempotency.abandon(user_id, idempotency_key)
+        raise
+    idempotency.finish(user_id, idempotency_key, fingerprint, 201, response_body)
+    read_router.pin_to_primary(request, response)
+    return response_body
@@ -0,0 +1,36 @@
+import asyncio
+from typing import Awaitable, Callable, List, Optional
+from app.core.logger import logger
+
+#Periodic maintenance jobs started with the application (one asyncio task per job and worker process).
+_tasks: List[asyncio.Task] = []
+
+async def _run_periodic(name: str, interval: float, job: Callable[[], Awaitable[None]], wakeup: Optional[asyncio.Event]):
+    while True:
+        try:
+            await job()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Background job '%s' failed", name)
+        if wakeup is None:
+            await asyncio.sleep(interval)
+        else:
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+
+#Schedules job() every interval seconds; a non-positive interval disables the job.
+#Setting the optional wakeup event runs the job early (the job is expected to clear it).
+def start_periodic(name: str, interval: float, job: Callable[[], Awaitable[None]], wakeup: Optional[asyncio.Event] = None):
+    if interval <= 0:
+        return
+    _tasks.append(asyncio.create_task(_run_periodic(name, interval, job, wakeup), name=name))
+    logger.info("Background job '%s' started (every %s s)", name, interval)
+
+async def stop_all():
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
@@ -11,6 +11,98 @@ class Settings(BaseSettings):
     EMAIL_HOST: str
     EMAIL_PORT: int
     PASSWORD_RESET_SECRET: str
+    EMAIL_USE_TLS: bool = True #false for local stand-ins such as aiosmtpd
+    EMAIL_SMTP_POOL_SIZE: int = 2 #long-lived SMTP connections per worker process
+    EMAIL_SMTP_MAX_IDLE_SECONDS: float = 240 #idle connections older than this are reopened
+    EMAIL_OUTBOX_POLL_SECONDS: float = 5 #sender poll interval (enqueues also wake it up), 0 disables it
+    EMAIL_BATCH_SIZE: int = 50
+    EMAIL_MAX_ATTEMPTS: int = 8
+    EMAIL_RETRY_BASE_SECONDS: float = 30 #doubles after every failed attempt
+    EMAIL_RETRY_MAX_SECONDS: float = 3600
+    EMAIL_CLAIM_LEASE_SECONDS: float = 300 #a claimed batch becomes due again after this if its sender died
+
+    #Connection pool (per engine and worker process; the app has one sync and one async engine)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30 #seconds to wait for a connection before failing
+    DB_POOL_RECYCLE: int = 1800 #seconds before a connection is replaced
+    DB_POOL_PRE_PING: bool = True #checks connections before use (drops dead ones after DB restarts)
+    DB_POOL_SLOW_WAIT_MS: float = 100 #checkouts waiting longer than this are logged
+    DB_POOL_LOG_INTERVAL_SECONDS: float = 60 #periodic pool summary in the log, 0 disables it
+    DB_POOL_OVERFLOW_LOG_SECONDS: float = 60 #overflow connections are logged at most once per this many seconds, with a count
+
+    #Read replicas for read-only routes (see app/core/replicas.py)
+    DATABASE_REPLICA_URLS: str = "" #comma-separated, same format as DATABASE_URL; empty sends all reads to the primary
+    REPLICA_HEALTH_CHECK_SECONDS: float = 5 #how often replicas are probed; an unhealthy one gets no reads until it passes again
+    REPLICA_HEALTH_TIMEOUT_SECONDS: float = 2
+    REPLICA_MAX_LAG_SECONDS: float = 10 #PostgreSQL replicas further behind than this are treated as unhealthy
+    READ_YOUR_WRITES_SECONDS: float = 10 #after a checkout the client's reads go to the primary for this long
+
+    #Password hashing
+    BCRYPT_ROUNDS: int = 12 #raising it rehashes existing passwords on their next login
+    PASSWORD_HASH_WORKERS: int = 2 #dedicated hashing threads per worker process
+    PASSWORD_HASH_MAX_QUEUE: int = 32 #requests waiting beyond this get 503 + Retry-After
+    PASSWORD_HASH_RETRY_AFTER_SECONDS: int = 1
+
+    #Authenticated-principal cache (per process)
+    PRINCIPAL_CACHE_MAXSIZE: int = 50000
+    PRINCIPAL_CACHE_TTL_SECONDS: float = 60
+
+    #Cart stock reservations
+    RESERVATION_TTL_SECONDS: int = 900 #how long an add-to-cart holds stock
+    RESERVATION_SWEEP_INTERVAL_SECONDS: float = 30 #0 disables the sweeper
+    RESERVATION_SWEEP_BATCH_SIZE: int = 500
+    CART_BATCH_MAX_ITEMS: int = 100 #lines accepted by POST /cart/batch
+
+    #Idempotency-Key support on POST /checkout
+    IDEMPOTENCY_KEY_TTL_SECONDS: int = 86400 #how long a stored response can be replayed
+    IDEMPOTENCY_WAIT_TIMEOUT_SECONDS: float = 30 #how long a duplicate waits for the in-flight attempt
+    IDEMPOTENCY_LOCK_TIMEOUT_SECONDS: float = 120 #an unfinished claim older than this is treated as abandoned
+    IDEMPOTENCY_CACHE_MAXSIZE: int = 10000
+    IDEMPOTENCY_PURGE_INTERVAL_SECONDS: float = 3600 #0 disables the purge job
+    IDEMPOTENCY_PURGE_BATCH_SIZE: int = 1000
+
+    #Product search: "auto" picks "postgres" (tsvector + trigram indexes) on PostgreSQL, otherwise "memory" (in-process inverted index)
+    SEARCH_BACKEND: str = "auto"
+    SEARCH_INDEX_RESYNC_SECONDS: float = 300 #full reload of the in-process index, picks up other workers' writes; 0 disables
+    SEARCH_CONDITION_MAX_IDS: int = 10000 #in-process index: most ids in the IN list of a keyword SQL condition
+
+    #Per-process product cache used by GET /products/{id}; cart holds and checkouts only refresh the stock of cached entries
+    PRODUCT_CACHE_MAXSIZE: int = 10000
+    PRODUCT_CACHE_TTL_SECONDS: float = 60
+    PRODUCT_CACHE_CONTROL: str = "public, max-age=0, must-revalidate" #Cache-Control of the public product endpoints (revalidated with ETags)
+
+    #Columnar in-process catalog snapshot for GET /products (needs NumPy)
+    CATALOG_SNAPSHOT_ENABLED: bool = False
+    CATALOG_REFRESH_SECONDS: float = 1 #how often changed products are applied to the snapshot
+
+    #Price histogram of GET /products/facets: comma-separated bucket boundaries (the last bucket is open-ended)
+    FACET_PRICE_BUCKETS: str = "10,25,50,100,250,500,1000"
+
+    #Bulk product import (POST /admin/products/import)
+    PRODUCT_IMPORT_BATCH_SIZE: int = 1000 #rows per multi-row upsert and commit
+    PRODUCT_IMPORT_MAX_ERRORS: int = 1000 #row errors listed in the report (all are counted)
+
+    #Per-route request metrics served on /metrics
+    METRICS_ENABLED: bool = True
+
+    #Admin order export (GET /admin/orders/export)
+    ORDER_EXPORT_BATCH_SIZE: int = 1000 #rows fetched per server-side cursor round-trip
+
+    #SQL profiler (see app/core/query_profiler.py); meant for development and staging
+    QUERY_PROFILER_ENABLED: bool = False
+    QUERY_SLOW_MS: float = 200 #statements slower than this are logged with their parameter shape
+    QUERY_N_PLUS_ONE_THRESHOLD: int = 5 #identical statements per request that are reported as a likely N+1
+    QUERY_EXPLAIN_SLOW: bool = False #also log the query plan of slow SELECTs (once per distinct statement)
+
+    #Logging (see app/core/logger.py)
+    LOG_LEVEL: str = "INFO"
+    LOG_LEVELS: str = "" #per-logger overrides, e.g. "app.cart=WARNING,sqlalchemy.engine=INFO"
+    LOG_FORMAT: str = "text" #"text" or "json" (one object per line)
+    LOG_FILE: str = "app.log"
+    LOG_QUEUE_SIZE: int = 10000 #records waiting for the writer thread; beyond this new records are dropped
+    LOG_SAMPLE_MAX_PER_WINDOW: int = 100 #INFO/DEBUG records per message template and window, 0 disables sampling
+    LOG_SAMPLE_WINDOW_SECONDS: float = 1
 
     class Config:
         env_file = ".env"  
@@ -2,15 +2,20 @@ from fastapi.responses import JSONResponse
 from fastapi import Request, HTTPException
 from starlette.status import HTTP_500_INTERNAL_SERVER_ERROR
 
+#Body of the error response for an HTTPException (also stored for Idempotency-Key replays)
+def http_exception_content(exc: HTTPException) -> dict:
+    return {
+        "error": True,
+        "message": exc.detail,
+        "code": exc.status_code
+    }
+
 #Defines a function to handle exceptions of type HTTPException
 def http_exception_handler(request: Request, exc: HTTPException):
     return JSONResponse(
         status_code=exc.status_code, #exc: the actual HTTPException that was raised.
-        content={
-            "error": True,
-            "message": exc.detail,
-            "code": exc.status_code
-        }
+        content=http_exception_content(exc),
+        headers=getattr(exc, "headers", None) #e.g. Retry-After on 503
     )
 
 #Defines a function to catch any exception that is not an HTTPException
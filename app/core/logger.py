@@ -1,11 +1,112 @@
+import atexit
+import json
 import logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
-    handlers=[
-        logging.FileHandler("app.log", mode='a'),  # Append mode
-        logging.StreamHandler()  # Also output to console
-    ]
-)
+import logging.handlers
+import queue
+import threading
+import time
+from app.core.config import settings
+
+#Logging pipeline: request code only puts records on an in-memory queue (QueueHandler); a background
+#QueueListener thread formats them and writes to app.log and the console. Records are formatted lazily
+#("... %s", value), so messages that are filtered out or sampled away are never rendered.
+
+#One JSON object per line.
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "suppressed", 0):
+            entry["suppressed"] = record.suppressed #similar messages dropped by sampling since the last one
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+#Rate-limits high-volume messages: at most max_per_window records per (logger, message template) and window.
+#Warnings and errors are never dropped. The next record that gets through reports how many were suppressed.
+class SamplingFilter(logging.Filter):
+    def __init__(self, max_per_window: int, window_seconds: float):
+        super().__init__()
+        self.max_per_window = max_per_window
+        self.window_seconds = window_seconds
+        self._windows = {} #(logger, template) -> [window start, emitted, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.max_per_window <= 0 or record.levelno >= logging.WARNING:
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.window_seconds:
+                suppressed = window[2] if window else 0
+                if len(self._windows) > 10000: #unbounded templates (e.g. pre-formatted messages): start over
+                    self._windows.clear()
+                self._windows[key] = [now, 1, 0]
+                record.suppressed = suppressed
+                return True
+            if window[1] < self.max_per_window:
+                window[1] += 1
+                record.suppressed = 0
+                return True
+            window[2] += 1
+            return False
+
+#Enqueues records as they are: the stock QueueHandler formats the message in the calling thread,
+#which is exactly the work we want off the request path. A full queue drops the record instead of blocking.
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+def _formatter() -> logging.Formatter:
+    if settings.LOG_FORMAT.lower() == "json":
+        return JsonFormatter()
+    return logging.Formatter("%(asctime)s - %(levelname)s - %(name)s - %(message)s")
+
+#LOG_LEVELS="app.cart=WARNING,sqlalchemy.engine=INFO" -> per-logger levels
+def _apply_logger_levels(spec: str):
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, level = item.partition("=")
+        logging.getLogger(name.strip()).setLevel(level.strip().upper())
+
+def _configure() -> logging.handlers.QueueListener:
+    formatter = _formatter()
+    file_handler = logging.FileHandler(settings.LOG_FILE, mode='a')  # Append mode
+    stream_handler = logging.StreamHandler()  # Also output to console
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(settings.LOG_SAMPLE_MAX_PER_WINDOW, settings.LOG_SAMPLE_WINDOW_SECONDS))
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(settings.LOG_LEVEL.upper())
+    _apply_logger_levels(settings.LOG_LEVELS)
+
+    listener = logging.handlers.QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop) #flushes what is still queued on shutdown
+    return listener
+
+listener = _configure()
 
 logger = logging.getLogger("app")
+
+#Child logger of "app" for one area (e.g. get_logger("cart") -> "app.cart"), so levels can be set per area.
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"app.{name}")
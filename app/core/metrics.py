@@ -0,0 +1,54 @@
+import threading
+from bisect import bisect_left
+from typing import Iterable
+
+#Latency buckets in seconds, from 1ms to 30s.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+#Fixed-bucket histogram (cheap to update from any thread), reported with cumulative "le" buckets like Prometheus.
+class Histogram:
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1) #last slot counts values above the largest bucket
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative = {}
+        running = 0
+        for bound, count in zip(self.buckets, counts):
+            running += count
+            cumulative[str(bound)] = running
+        running += counts[-1]
+        cumulative["+Inf"] = running
+        return {"count": running, "sum": round(total, 6), "buckets": cumulative}
+
+#Prometheus text exposition helpers (format version 0.0.4).
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label(value)}"' for key, value in labels.items()) + "}"
+
+def metric_header(name: str, kind: str, help_text: str) -> list:
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+
+def histogram_lines(name: str, labels: dict, histogram: Histogram) -> list:
+    snapshot = histogram.snapshot()
+    lines = [f"{name}_bucket{format_labels({**labels, 'le': bound})} {count}" for bound, count in snapshot["buckets"].items()]
+    lines.append(f"{name}_sum{format_labels(labels)} {snapshot['sum']}")
+    lines.append(f"{name}_count{format_labels(labels)} {snapshot['count']}")
+    return lines
@@ -0,0 +1,107 @@
+import threading
+import time
+from sqlalchemy import event, exc
+from app.core.logger import logger
+from app.core.metrics import Histogram
+
+#Connections open beyond pool_size. QueuePool.overflow() starts at -pool_size and counts every connection opened,
+#so it is negative while the pool is below capacity.
+def overflow_connections(pool) -> int:
+    return max(pool.overflow(), 0)
+
+#Connection pool statistics for one engine: checkouts, time spent waiting for a connection, overflow events and timeouts.
+class PoolStats:
+    def __init__(self, name: str, slow_wait_seconds: float, overflow_log_seconds: float = 60):
+        self.name = name
+        self.slow_wait_seconds = slow_wait_seconds
+        self.overflow_log_seconds = overflow_log_seconds #at most one overflow log line per this many seconds
+        self.wait_time = Histogram() #seconds spent in pool checkout
+        self.checkouts = 0
+        self.overflow_events = 0 #checkouts that had to open a connection beyond pool_size
+        self.timeouts = 0 #checkouts that gave up after pool_timeout
+        self.pool = None #set by the instrumented pool
+        self._lock = threading.Lock()
+        self._overflow_logged_at = None
+        self._overflow_unlogged = 0 #overflow events since the last overflow log line
+
+    def record_checkout(self, waited: float):
+        self.wait_time.observe(waited)
+        with self._lock:
+            self.checkouts += 1
+        if waited >= self.slow_wait_seconds:
+            logger.warning("[pool:%s] waited %.1f ms for a connection: %s", self.name, waited * 1000, self.describe())
+
+    #Pool "connect" event (a new DBAPI connection): the overflow counter starts at -pool_size,
+    #so a positive value means the connection was opened beyond pool_size.
+    def on_connect(self, dbapi_connection, connection_record):
+        if self.pool is not None and self.pool.overflow() > 0:
+            self.record_overflow()
+
+    #A burst of overflow connections is logged as one line with a count, not one line each.
+    def record_overflow(self):
+        now = time.monotonic()
+        with self._lock:
+            self.overflow_events += 1
+            self._overflow_unlogged += 1
+            if self._overflow_logged_at is not None and now - self._overflow_logged_at < self.overflow_log_seconds:
+                return
+            count, self._overflow_unlogged, self._overflow_logged_at = self._overflow_unlogged, 0, now
+        logger.info("[pool:%s] %s overflow connection(s) opened: %s", self.name, count, self.describe())
+
+    def record_timeout(self, waited: float):
+        self.wait_time.observe(waited)
+        with self._lock:
+            self.timeouts += 1
+        logger.error("[pool:%s] timed out after %.1f s waiting for a connection: %s", self.name, waited, self.describe())
+
+    #Live pool occupancy (QueuePool counters) as a short log string.
+    def describe(self) -> str:
+        pool = self.pool
+        if pool is None:
+            return "pool not created yet"
+        return f"size={pool.size()} checked_out={pool.checkedout()} idle={pool.checkedin()} overflow={overflow_connections(pool)}"
+
+    def snapshot(self) -> dict:
+        pool = self.pool
+        with self._lock:
+            data = {
+                "checkouts": self.checkouts,
+                "overflow_events": self.overflow_events,
+                "timeouts": self.timeouts,
+            }
+        if pool is not None:
+            data.update({
+                "pool_size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": overflow_connections(pool),
+                "overflow_counter": pool.overflow(), #QueuePool's raw counter: -pool_size + connections opened
+            })
+        data["wait_seconds"] = self.wait_time.snapshot()
+        return data
+
+
+#Times Pool.connect(), the public checkout call the engine makes for every connection it needs
+#(waiting for a free connection, opening a new one, pre-ping).
+class _InstrumentedPoolMixin:
+    stats: PoolStats = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.stats.on_connect not in self.dispatch.connect: #pool.recreate() carries the listeners over
+            event.listen(self, "connect", self.stats.on_connect)
+
+    def connect(self):
+        self.stats.pool = self #pool.recreate() (e.g. engine.dispose()) builds a new instance of the same class
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.stats.record_timeout(time.perf_counter() - started)
+            raise
+        self.stats.record_checkout(time.perf_counter() - started)
+        return connection
+
+#Returns a subclass of pool_class that reports into stats.
+def instrumented_pool_class(pool_class, stats: PoolStats):
+    return type(f"Instrumented{pool_class.__name__}", (_InstrumentedPoolMixin, pool_class), {"stats": stats})
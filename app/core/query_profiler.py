@@ -0,0 +1,117 @@
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
+from app.core.config import settings
+from app.core.logger import get_logger
+
+logger = get_logger("sql")
+
+#SQL profiler (QUERY_PROFILER_ENABLED): attributes every statement to the request that ran it, reports statements
+#repeated within one request (N+1 patterns), logs slow statements with the shape of their parameters and can log
+#the query plan of slow SELECTs. Statements outside a request (background jobs) only get the slow-query log.
+
+MAX_STATEMENT_LOG_LENGTH = 1000
+MAX_EXPLAINED_STATEMENTS = 1000 #each distinct slow statement is explained once per process
+
+#Statements executed while handling one request.
+class RequestProfile:
+    __slots__ = ("statements", "label")
+
+    def __init__(self, label: str):
+        self.statements = Counter() #statement text -> executions
+        self.label = label #"GET /orders/{order_id}" once routing is done
+
+current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("current_profile", default=None)
+
+_explained = set()
+
+def _shorten(statement: str) -> str:
+    statement = " ".join(statement.split())
+    if len(statement) > MAX_STATEMENT_LOG_LENGTH:
+        return statement[:MAX_STATEMENT_LOG_LENGTH] + "..."
+    return statement
+
+#Types of the bound parameters, never their values (they may hold emails, tokens or password hashes).
+def parameter_shape(parameters, executemany: bool) -> str:
+    if executemany:
+        rows = list(parameters or ())
+        return f"{len(rows)} rows of {parameter_shape(rows[0], False) if rows else '()'}"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(type(value).__name__ for value in parameters) + ")"
+    return type(parameters).__name__
+
+#Query plan of a slow SELECT, read on a separate cursor so the statement's own result set is untouched.
+#Plain EXPLAIN only plans the statement; it does not run it again.
+def _explain(conn, statement: str, parameters) -> Optional[str]:
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return "\n".join(" ".join(str(value) for value in row) for row in cursor.fetchall())
+    finally:
+        cursor.close()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._profiler_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - getattr(context, "_profiler_started", time.perf_counter())
+    profile = current_profile.get()
+    if profile is not None:
+        profile.statements[statement] += 1
+    if elapsed * 1000 < settings.QUERY_SLOW_MS:
+        return
+    logger.warning(
+        "Slow query (%.1f ms) in %s: %s | params: %s",
+        elapsed * 1000, profile.label if profile else "background", _shorten(statement), parameter_shape(parameters, executemany)
+    )
+    if (
+        settings.QUERY_EXPLAIN_SLOW and not executemany and statement not in _explained
+        and len(_explained) < MAX_EXPLAINED_STATEMENTS and statement.lstrip().upper().startswith("SELECT")
+    ):
+        _explained.add(statement)
+        try:
+            logger.warning("Query plan for %s:\n%s", _shorten(statement), _explain(conn, statement, parameters))
+        except Exception as e:
+            logger.warning("EXPLAIN failed for %s: %s", _shorten(statement), e)
+
+#Profiles every statement run on sync_engine (for an AsyncEngine pass async_engine.sync_engine).
+def install_query_profiler(sync_engine):
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+#Reports statements that ran QUERY_N_PLUS_ONE_THRESHOLD or more times in one request.
+def report_repeated_statements(profile: RequestProfile):
+    total = sum(profile.statements.values())
+    for statement, count in profile.statements.most_common():
+        if count < settings.QUERY_N_PLUS_ONE_THRESHOLD:
+            break
+        logger.warning(
+            "Possible N+1 in %s: statement ran %s times (%s statements in the request): %s",
+            profile.label, count, total, _shorten(statement)
+        )
+
+
+#Pure ASGI middleware that opens a RequestProfile for each HTTP request and checks it for N+1 patterns at the end.
+class QueryProfilerMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        profile = RequestProfile(f"{scope['method']} {scope['path']}")
+        token = current_profile.set(profile)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_profile.reset(token)
+            route = scope.get("route")
+            if route is not None:
+                profile.label = f"{scope['method']} {route.path}"
+            report_repeated_statements(profile)
@@ -0,0 +1,141 @@
+import asyncio
+import hashlib
+import itertools
+import time
+from typing import List, Optional
+from fastapi import Request, Response
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, replica_engines
+from app.core.logger import get_logger
+
+logger = get_logger("db")
+
+#Read routing: read-only routes take their session from get_read_db, which spreads them round-robin over the
+#healthy replicas (DATABASE_REPLICA_URLS) and falls back to the primary when there are none.
+#A background job probes every replica; one that fails the probe (or, on PostgreSQL, lags more than
+#REPLICA_MAX_LAG_SECONDS) gets no reads until it passes again. A replica that refuses a connection is taken out at once.
+#Read-your-writes: after a write it reads back (checkout, cart changes, admin product writes and imports) the client is
+#pinned to the primary for READ_YOUR_WRITES_SECONDS, through a cookie (works across workers) and an in-process pin
+#keyed by the bearer token (for clients that ignore cookies).
+
+PIN_COOKIE = "read_primary_until"
+
+class Replica:
+    def __init__(self, name: str, engine: AsyncEngine):
+        self.name = name
+        self.engine = engine
+        self.sessionmaker = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+        self.healthy = True
+        self.lag_seconds: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.reads = 0
+
+    def snapshot(self) -> dict:
+        return {"healthy": self.healthy, "lag_seconds": self.lag_seconds, "last_error": self.last_error, "reads": self.reads}
+
+
+class ReadRouter:
+    def __init__(self, replicas: List[Replica]):
+        self.replicas = replicas
+        self._turn = itertools.count()
+        self._pins = TTLCache(maxsize=100000, ttl=settings.READ_YOUR_WRITES_SECONDS) #client key -> True
+        self.primary_reads = 0
+
+    #Next healthy replica in round-robin order, or None to read from the primary.
+    def pick(self) -> Optional[Replica]:
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._turn) % len(healthy)]
+
+    def mark_down(self, replica: Replica, error: str):
+        if replica.healthy:
+            logger.warning("Replica %s taken out of rotation: %s", replica.name, error)
+        replica.healthy = False
+        replica.last_error = error
+
+    async def _probe(self, replica: Replica):
+        async with replica.engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            if conn.dialect.name == "postgresql":
+                #NULL on a primary (or before the first replayed transaction): no lag to report
+                replica.lag_seconds = await conn.scalar(text(
+                    "SELECT CASE WHEN pg_is_in_recovery() THEN EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+                ))
+
+    #Background job (app/main.py): probes every replica and updates its health.
+    async def check_health(self):
+        for replica in self.replicas:
+            try:
+                await asyncio.wait_for(self._probe(replica), timeout=settings.REPLICA_HEALTH_TIMEOUT_SECONDS)
+            except (DBAPIError, OSError, asyncio.TimeoutError) as e:
+                self.mark_down(replica, str(e) or type(e).__name__)
+                continue
+            if replica.lag_seconds is not None and replica.lag_seconds > settings.REPLICA_MAX_LAG_SECONDS:
+                self.mark_down(replica, f"replication lag {replica.lag_seconds:.1f}s")
+                continue
+            if not replica.healthy:
+                logger.info("Replica %s is back in rotation", replica.name)
+            replica.healthy = True
+            replica.last_error = None
+
+    #The bearer token identifies the client for the in-process pin (hashed, the token itself is not kept).
+    def _client_key(self, request: Request) -> Optional[str]:
+        auth_header = request.headers.get("Authorization")
+        return hashlib.sha256(auth_header.encode()).hexdigest() if auth_header else None
+
+    #Sends this client's reads to the primary for READ_YOUR_WRITES_SECONDS; call after a write it will read back.
+    def pin_to_primary(self, request: Request, response: Response):
+        if not self.replicas:
+            return
+        until = time.time() + settings.READ_YOUR_WRITES_SECONDS
+        response.set_cookie(PIN_COOKIE, f"{until:.0f}", max_age=int(settings.READ_YOUR_WRITES_SECONDS) + 1, httponly=True, samesite="lax")
+        key = self._client_key(request)
+        if key:
+            self._pins.set(key, True)
+
+    def is_pinned(self, request: Request) -> bool:
+        try:
+            if float(request.cookies.get(PIN_COOKIE, 0)) > time.time():
+                return True
+        except ValueError:
+            pass
+        key = self._client_key(request)
+        return key is not None and self._pins.get(key) is not None
+
+    def stats(self) -> dict:
+        return {"primary_reads": self.primary_reads, "replicas": {replica.name: replica.snapshot() for replica in self.replicas}}
+
+
+read_router = ReadRouter([Replica(f"replica{i}", engine) for i, engine in enumerate(replica_engines)])
+
+#Opens a read-only session (never write through it) on the next healthy replica, or on the primary when the client is
+#pinned or no replica answers. The replica connection is opened up front, so a replica that is down falls back to the
+#primary here instead of failing the request. The caller closes the session.
+async def open_read_session(request: Request):
+    replica = None if read_router.is_pinned(request) else read_router.pick()
+    if replica is not None:
+        db = replica.sessionmaker()
+        try:
+            #bounded like the health probe: a replica that stops answering must not hang the request
+            await asyncio.wait_for(db.connection(), timeout=settings.REPLICA_HEALTH_TIMEOUT_SECONDS)
+            replica.reads += 1
+            return db
+        except (DBAPIError, ConnectionRefusedError, OSError, asyncio.TimeoutError) as e:
+            await db.close()
+            read_router.mark_down(replica, str(e) or type(e).__name__)
+    read_router.primary_reads += 1
+    return AsyncSessionLocal()
+
+#Session dependency for read-only routes. Routes that only read on some requests call open_read_session themselves,
+#so the others never open a replica connection.
+async def get_read_db(request: Request):
+    db = await open_read_session(request)
+    try:
+        yield db
+    finally:
+        await db.close()
@@ -0,0 +1,127 @@
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
+from app.core.metrics import Histogram, metric_header, histogram_lines, format_labels
+
+#Per-route HTTP metrics (requests, status codes, latency, DB time and query count per request), served on /metrics.
+
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+UNMATCHED_ROUTE = "<unmatched>" #404s and other paths no route matched (raw paths would explode the label set)
+
+#Database work done while handling one request. The engine hooks below find it through a context variable,
+#which also reaches the greenlet of the async engine and the worker thread of sync dependencies.
+class RequestDbStats:
+    __slots__ = ("queries", "seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+current_db_stats: ContextVar[Optional[RequestDbStats]] = ContextVar("current_db_stats", default=None)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_db_stats.get()
+    started = getattr(context, "_metrics_started", None)
+    if stats is None or started is None:
+        return
+    stats.queries += 1
+    stats.seconds += time.perf_counter() - started
+
+#Times every statement run on sync_engine (for an AsyncEngine pass async_engine.sync_engine).
+def instrument_engine(sync_engine):
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+#Metrics of one (method, route) pair.
+class RouteMetrics:
+    def __init__(self):
+        self.latency = Histogram()
+        self.db_time = Histogram()
+        self.db_queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.statuses = {} #status code -> count
+
+class RequestMetrics:
+    def __init__(self):
+        self.routes = {} #(method, route template) -> RouteMetrics
+        self.in_progress = {} #method -> requests currently being handled
+        self._lock = threading.Lock()
+
+    def started(self, method: str):
+        with self._lock:
+            self.in_progress[method] = self.in_progress.get(method, 0) + 1
+
+    def finished(self, method: str, route: str, status: int, elapsed: float, db: RequestDbStats):
+        key = (method, route)
+        with self._lock:
+            self.in_progress[method] -= 1
+            metrics = self.routes.get(key)
+            if metrics is None:
+                metrics = self.routes[key] = RouteMetrics()
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+        metrics.latency.observe(elapsed)
+        metrics.db_time.observe(db.seconds)
+        metrics.db_queries.observe(db.queries)
+
+    def render(self) -> str:
+        with self._lock:
+            routes = sorted(self.routes.items())
+            statuses = [(key, sorted(metrics.statuses.items())) for key, metrics in routes]
+            in_progress = sorted(self.in_progress.items())
+
+        lines = metric_header("http_requests_total", "counter", "HTTP requests by route and status code.")
+        for (method, route), counts in statuses:
+            for status, count in counts:
+                lines.append(f"http_requests_total{format_labels({'method': method, 'route': route, 'status': status})} {count}")
+        lines += metric_header("http_requests_in_progress", "gauge", "HTTP requests currently being handled.")
+        for method, count in in_progress:
+            lines.append(f"http_requests_in_progress{format_labels({'method': method})} {count}")
+        for name, attribute, help_text in (
+            ("http_request_duration_seconds", "latency", "Time to handle the request."),
+            ("http_request_db_seconds", "db_time", "Time spent executing SQL statements per request."),
+            ("http_request_db_queries", "db_queries", "SQL statements executed per request."),
+        ):
+            lines += metric_header(name, "histogram", help_text)
+            for (method, route), metrics in routes:
+                lines += histogram_lines(name, {"method": method, "route": route}, getattr(metrics, attribute))
+        return "\n".join(lines) + "\n"
+
+request_metrics = RequestMetrics()
+
+
+#Pure ASGI middleware (no per-request Request/Response objects). The route template ("/orders/{order_id}")
+#is read from the scope after routing, so label cardinality stays bounded by the number of routes.
+class MetricsMiddleware:
+    def __init__(self, app, metrics: RequestMetrics = request_metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        status = 500 #reported if the app raises before sending a response
+        db_stats = RequestDbStats()
+        token = current_db_stats.set(db_stats)
+        started = time.perf_counter()
+        self.metrics.started(method)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or UNMATCHED_ROUTE
+            self.metrics.finished(method, path, status, time.perf_counter() - started, db_stats)
+            current_db_stats.reset(token)
@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, HTTPException #Request: needed to access request data in handlers
 from fastapi.openapi.utils import get_openapi #used to customize the OpenAPI schema (for Swagger docs)
 from dotenv import load_dotenv #Imports function to load environment variables from a .env file
@@ -6,14 +7,48 @@ from app.auth.routes import router as auth_router
 from app.products.routes import admin_router, public_router
 from app.cart.routes import router as cart_router
 from app.checkout.routes import router as checkout_router
-from app.orders.routes import router as orders_router
+from app.orders.routes import router as orders_router, admin_router as admin_orders_router
+from app.monitoring.routes import router as monitoring_router
 
 from app.core.error_handler import http_exception_handler, unhandled_exception_handler
+from app.core.database import init_db, log_pool_stats, engine, async_engine, replica_engines
+from app.core.replicas import read_router
+from app.core.request_metrics import MetricsMiddleware, instrument_engine
+from app.core.query_profiler import QueryProfilerMiddleware
+from app.core.config import settings
+from app.core import background
+from app.cart.reservations import release_expired_reservations
+from app.checkout.idempotency import purge_expired_keys
+from app.notifications.outbox import send_pending_emails, outbox_wakeup
+from app.utils.email_utils import smtp_pool
+from app.products.catalog import catalog, catalog_enabled
 from starlette.status import HTTP_500_INTERNAL_SERVER_ERROR
 
 load_dotenv() #Loads all variables from .env into the environment.
 
-app = FastAPI() #Creates an instance of the FastAPI application.
+#Creates missing tables and indexes (including the product search indexes) when the server starts,
+#then starts the periodic background jobs; stops them and closes pooled SMTP connections on shutdown.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_db()
+    background.start_periodic("pool-stats-log", settings.DB_POOL_LOG_INTERVAL_SECONDS, log_pool_stats)
+    background.start_periodic("reservation-sweeper", settings.RESERVATION_SWEEP_INTERVAL_SECONDS, release_expired_reservations)
+    background.start_periodic("idempotency-key-purge", settings.IDEMPOTENCY_PURGE_INTERVAL_SECONDS, purge_expired_keys)
+    background.start_periodic("email-outbox", settings.EMAIL_OUTBOX_POLL_SECONDS, send_pending_emails, wakeup=outbox_wakeup)
+    if read_router.replicas:
+        background.start_periodic("replica-health", settings.REPLICA_HEALTH_CHECK_SECONDS, read_router.check_health)
+    if catalog_enabled():
+        background.start_periodic("catalog-refresh", settings.CATALOG_REFRESH_SECONDS, catalog.refresh)
+    try:
+        yield
+    finally:
+        await background.stop_all()
+        smtp_pool.close_all()
+
+#Creates an instance of the FastAPI application. The default response class is kept on purpose: FastAPI only
+#serializes response_model routes with Pydantic's own JSON encoder when no custom class is set. Hot read routes
+#use orjson through json_response (app/utils/serialization.py) instead.
+app = FastAPI(lifespan=lifespan)
 #including routers
 app.include_router(auth_router)
 app.include_router(admin_router)
@@ -21,6 +56,20 @@ app.include_router(public_router)
 app.include_router(cart_router)
 app.include_router(checkout_router)
 app.include_router(orders_router)
+app.include_router(admin_orders_router)
+app.include_router(monitoring_router)
+
+#Per-route request metrics (served on /metrics), including the SQL time and statement count of each request.
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    instrument_engine(engine)
+    instrument_engine(async_engine.sync_engine)
+    for replica_engine in replica_engines:
+        instrument_engine(replica_engine.sync_engine)
+
+#Attributes SQL statements to requests and reports N+1 patterns (the engine hooks are installed in app/core/database.py).
+if settings.QUERY_PROFILER_ENABLED:
+    app.add_middleware(QueryProfilerMiddleware)
 
 #Customizes Swagger UI to include JWT Bearer token authentication in docs.
 def custom_openapi():
@@ -0,0 +1,58 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_async_db, pool_stats
+from app.core.replicas import read_router
+from app.auth.jwt_handler import get_current_admin_user
+from app.products.cache import product_cache
+from app.auth.principal_cache import principal_cache
+from app.auth.hashing import hashing_pool
+from app.core.request_metrics import request_metrics
+from app.core.metrics import PROMETHEUS_CONTENT_TYPE, metric_header, histogram_lines, format_labels
+
+router = APIRouter(tags=["Monitoring"])
+
+#Liveness check that also proves a database connection can be checked out.
+@router.get("/health")
+async def health(db: AsyncSession = Depends(get_async_db)):
+    await db.execute(text("SELECT 1"))
+    return {"status": "ok"}
+
+#Connection pool occupancy, wait-time histogram, overflow events and timeouts per engine (replicas included),
+#replica health and read counts, plus in-process cache counters.
+@router.get("/admin/health/db-pool")
+async def db_pool_health(current_user: dict = Depends(get_current_admin_user)):
+    return {
+        "pools": {name: stats.snapshot() for name, stats in pool_stats.items()},
+        "read_routing": read_router.stats(),
+        "product_cache": product_cache.stats(),
+        "principal_cache": principal_cache.stats(),
+        "password_hashing": hashing_pool.stats(),
+    }
+
+#Pool occupancy and checkout counters per engine in Prometheus format.
+def _pool_metric_lines() -> list:
+    lines = []
+    snapshots = {name: stats.snapshot() for name, stats in pool_stats.items()}
+    for field, kind, help_text in (
+        ("checked_out", "gauge", "Connections currently checked out."),
+        ("idle", "gauge", "Idle connections in the pool."),
+        ("overflow", "gauge", "Connections open beyond pool_size (0 while below capacity)."), #never QueuePool's raw counter
+        ("checkouts", "counter", "Connection checkouts."),
+        ("overflow_events", "counter", "Checkouts that opened an overflow connection."),
+        ("timeouts", "counter", "Checkouts that timed out."),
+    ):
+        name = f"db_pool_{field}" + ("_total" if kind == "counter" else "")
+        lines += metric_header(name, kind, help_text)
+        lines += [f"{name}{format_labels({'engine': engine})} {data[field]}" for engine, data in snapshots.items() if field in data]
+    lines += metric_header("db_pool_wait_seconds", "histogram", "Time spent waiting for a connection.")
+    for engine, stats in pool_stats.items():
+        lines += histogram_lines("db_pool_wait_seconds", {"engine": engine}, stats.wait_time)
+    return lines
+
+#Prometheus scrape endpoint: per-route request counts, status codes, latency, DB time and query counts, plus pool metrics.
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    body = request_metrics.render() + "\n".join(_pool_metric_lines()) + "\n"
+    return PlainTextResponse(body, media_type=PROMETHEUS_CONTENT_TYPE)
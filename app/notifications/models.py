@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index, func
+from app.core.database import Base
+
+#Persistent outbox: emails are stored here by the request handlers and delivered by the background sender.
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    to_email = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(Text, nullable=False)
+    status = Column(String, nullable=False, default="pending") #pending -> sent, or failed after EMAIL_MAX_ATTEMPTS
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now()) #also the claim lease
+    last_error = Column(String)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    sent_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (Index("ix_email_outbox_status_next_attempt", "status", "next_attempt_at"),) #the sender's scan
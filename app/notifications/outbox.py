@@ -0,0 +1,90 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.logger import get_logger
+from app.notifications.models import EmailOutbox
+from app.utils.email_utils import send_batch
+
+logger = get_logger("notifications")
+
+PENDING = "pending"
+SENT = "sent"
+FAILED = "failed"
+
+#Set when a message is enqueued, so the sender does not wait for its next poll.
+outbox_wakeup = asyncio.Event()
+
+#Adds an email to the outbox in the caller's transaction; it is sent after the caller commits.
+def enqueue_email(db: AsyncSession, to_email: str, subject: str, body: str):
+    db.add(EmailOutbox(to_email=to_email, subject=subject, body=body, status=PENDING, attempts=0))
+
+def notify_sender():
+    outbox_wakeup.set()
+
+def _backoff(attempts: int) -> timedelta:
+    return timedelta(seconds=min(settings.EMAIL_RETRY_BASE_SECONDS * 2 ** (attempts - 1), settings.EMAIL_RETRY_MAX_SECONDS))
+
+#Claims up to one batch of due messages. Pushing next_attempt_at forward acts as a lease,
+#so other workers skip them and a crashed sender's messages become due again when the lease runs out.
+async def _claim_batch(db: AsyncSession, now: datetime):
+    rows = (await db.execute(
+        select(EmailOutbox.id, EmailOutbox.to_email, EmailOutbox.subject, EmailOutbox.body, EmailOutbox.attempts)
+        .where(EmailOutbox.status == PENDING, EmailOutbox.next_attempt_at <= now)
+        .order_by(EmailOutbox.next_attempt_at)
+        .limit(settings.EMAIL_BATCH_SIZE)
+        .with_for_update(skip_locked=True)
+    )).all()
+    if rows:
+        await db.execute(
+            update(EmailOutbox)
+            .where(EmailOutbox.id.in_([row.id for row in rows]))
+            .values(next_attempt_at=now + timedelta(seconds=settings.EMAIL_CLAIM_LEASE_SECONDS))
+        )
+    await db.commit()
+    return rows
+
+async def _record_results(db: AsyncSession, rows, results: dict, now: datetime):
+    sent_ids = [row.id for row in rows if results.get(row.id, "not sent") is None]
+    if sent_ids:
+        await db.execute(update(EmailOutbox).where(EmailOutbox.id.in_(sent_ids)).values(status=SENT, sent_at=now))
+    for row in rows:
+        error = results.get(row.id, "not sent")
+        if error is None:
+            continue
+        attempts = row.attempts + 1
+        final = attempts >= settings.EMAIL_MAX_ATTEMPTS
+        await db.execute(
+            update(EmailOutbox).where(EmailOutbox.id == row.id).values(
+                attempts=attempts,
+                last_error=error[:500],
+                status=FAILED if final else PENDING,
+                next_attempt_at=now + _backoff(attempts),
+            )
+        )
+        if final:
+            logger.error("Giving up on outbox email %s to %s after %s attempts: %s", row.id, row.to_email, attempts, error)
+    await db.commit()
+
+#Background job: sends due messages in batches over pooled SMTP connections (one thread per connection).
+async def send_pending_emails():
+    outbox_wakeup.clear()
+    async with AsyncSessionLocal() as db:
+        while True:
+            rows = await _claim_batch(db, datetime.now(timezone.utc))
+            if not rows:
+                return
+            per_connection = settings.EMAIL_SMTP_POOL_SIZE
+            chunks = [
+                [(row.id, row.to_email, row.subject, row.body) for row in rows[i::per_connection]]
+                for i in range(min(per_connection, len(rows)))
+            ]
+            results = {}
+            for chunk_results in await asyncio.gather(*(asyncio.to_thread(send_batch, chunk) for chunk in chunks)):
+                results.update(chunk_results)
+            await _record_results(db, rows, results, datetime.now(timezone.utc))
+            logger.info("Outbox batch: %s/%s emails sent", sum(1 for e in results.values() if e is None), len(rows))
+            if len(rows) < settings.EMAIL_BATCH_SIZE:
+                return
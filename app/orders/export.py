@@ -0,0 +1,92 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, Optional
+from sqlalchemy import select
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.logger import get_logger
+from app.orders.models import Order, OrderItem
+
+logger = get_logger("orders")
+
+#Streaming order export for finance: orders joined with their items are read through a server-side cursor
+#(stream + yield_per) and written out one partition at a time, so memory stays flat for any date range.
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+CSV_HEADER = ["order_id", "user_id", "status", "total_price", "created_at", "product_id", "quantity", "price_per_unit"]
+
+def export_query(start: Optional[datetime], end: Optional[datetime], status: Optional[str]):
+    query = (
+        select(
+            Order.id, Order.user_id, Order.status, Order.total_price, Order.created_at,
+            OrderItem.product_id, OrderItem.quantity, OrderItem.price_per_unit,
+        )
+        .outerjoin(OrderItem, OrderItem.order_id == Order.id)
+        .order_by(Order.created_at, Order.id, OrderItem.id) #served by ix_orders_created_at_id; keeps each order's items together
+    )
+    if start is not None:
+        query = query.where(Order.created_at >= start)
+    if end is not None:
+        query = query.where(Order.created_at < end)
+    if status:
+        query = query.where(Order.status == status)
+    return query
+
+def _csv_chunk(rows) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row.id, row.user_id, row.status, row.total_price, row.created_at.isoformat() if row.created_at else "", row.product_id, row.quantity, row.price_per_unit])
+    return buffer.getvalue()
+
+#NDJSON has one object per order with its items nested. An order whose items straddle two partitions is held back
+#until its last item has been read; returns the finished lines and the order still open.
+def _ndjson_chunk(rows, current: Optional[dict]):
+    lines = []
+    for row in rows:
+        if current is None or current["id"] != row.id:
+            if current is not None:
+                lines.append(json.dumps(current))
+            current = {
+                "id": row.id,
+                "user_id": row.user_id,
+                "status": row.status,
+                "total_price": row.total_price,
+                "created_at": row.created_at.isoformat() if row.created_at else None,
+                "items": [],
+            }
+        if row.product_id is not None:
+            current["items"].append({"product_id": row.product_id, "quantity": row.quantity, "price_per_unit": row.price_per_unit})
+    return "".join(line + "\n" for line in lines), current
+
+#Body of the export response. It opens its own session: FastAPI dependencies are closed before a streaming body runs.
+async def stream_export(query, file_format: str, compress: bool) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(wbits=31) if compress else None #wbits=31: gzip container
+    rows_written = 0
+    current = None
+
+    def encode(text: str) -> bytes:
+        data = text.encode()
+        return compressor.compress(data) if compressor else data
+
+    if file_format == "csv":
+        yield encode(",".join(CSV_HEADER) + "\r\n")
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=settings.ORDER_EXPORT_BATCH_SIZE))
+        async for rows in result.partitions():
+            if file_format == "csv":
+                text = _csv_chunk(rows)
+            else:
+                text, current = _ndjson_chunk(rows, current)
+            rows_written += len(rows)
+            chunk = encode(text)
+            if chunk:
+                yield chunk
+    if current is not None:
+        yield encode(json.dumps(current) + "\n")
+    if compressor:
+        yield compressor.flush()
+    logger.info("Order export finished: %s rows (%s%s)", rows_written, file_format, ", gzip" if compress else "")
@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, Float, ForeignKey, String
+from sqlalchemy import Column, Integer, Float, ForeignKey, String, Index
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 from sqlalchemy import DateTime, func, String
+from datetime import datetime, timezone
 
 #Provides all orders placed by a user
 class Order(Base):
@@ -11,9 +12,16 @@ class Order(Base):
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
     total_price = Column(Float, nullable=False)
     status = Column(String, default="Completed")  # default status
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    #set client-side as well so every row stores the same format (SQLite keeps datetimes as text, and CURRENT_TIMESTAMP
+    #has no microseconds, which breaks the (created_at, id) comparison of history cursors)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), server_default=func.now())
     items = relationship("OrderItem", back_populates="order", cascade="all, delete")
 
+    __table_args__ = (
+        Index("ix_orders_user_created_at_id", "user_id", "created_at", "id"), #keyset pages of a user's order history
+        Index("ix_orders_created_at_id", "created_at", "id"), #date-range scans of the admin export
+    )
+
 #One-to-many relationship with OrderItem.back_populates creates a two-way connection.
 # cascade="all, delete" ensures all related order items are deleted when the order is deleted.
 
@@ -22,9 +30,12 @@ class OrderItem(Base):
     __tablename__ = "order_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id", ondelete="CASCADE"))
+    order_id = Column(Integer, ForeignKey("orders.id", ondelete="CASCADE"), index=True) #items of a set of orders are loaded with IN (...)
     product_id = Column(Integer)
     quantity = Column(Integer)
     price_per_unit = Column(Float)
 
     order = relationship("Order", back_populates="items")
+    #Read-only link to the product (order_items.product_id has no foreign key constraint, hence the explicit join).
+    #raise: never loaded implicitly; a query that needs it asks for it, e.g. selectinload(OrderItem.product) in GET /orders/details.
+    product = relationship("Product", primaryjoin="foreign(OrderItem.product_id) == Product.id", viewonly=True, lazy="raise")
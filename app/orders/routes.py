@@ -1,51 +1,154 @@
-from fastapi import APIRouter, Depends, HTTPException 
-from sqlalchemy.orm import Session
-from app.core.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_async_db
+from app.core.replicas import get_read_db
 from app.auth.utils import get_current_user
-from app.orders.models import Order
-from app.orders.schemas import OrderSummaryOut, OrderDetailOut
-from app.core.logger import logger
+from app.auth.jwt_handler import get_current_admin_user
+from app.orders.models import Order, OrderItem
+from app.orders.schemas import OrderSummaryOut, OrderDetailOut, OrderBatchOut
+from app.orders.export import FORMATS, export_query, stream_export
+from app.utils.cursor_utils import encode_cursor, decode_cursor
+from app.utils.serialization import json_response, order_summary_out
+from app.core.logger import get_logger
+
+logger = get_logger("orders")
 
 router = APIRouter(prefix="/orders", tags=["Orders"])
-#To Get Order History in summary format
+
+HISTORY_CURSOR_KEY = "created_at"
+
+#Cursor values of the order history: [created_at as ISO string, id] of the last order of the page.
+def _history_cursor_values(cursor: str) -> tuple:
+    values = decode_cursor(cursor, HISTORY_CURSOR_KEY, 2)
+    try:
+        created_at, order_id = values
+        return datetime.fromisoformat(created_at), int(order_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+#To Get Order History in summary format, newest first, one page at a time.
+#Pass the X-Next-Cursor header value as cursor for the next page (the header is absent on the last page).
 @router.get("/", response_model=list[OrderSummaryOut])
-def get_order_history(
-    db: Session = Depends(get_db),
+async def get_order_history(
+    response: Response,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page."),
+    db: AsyncSession = Depends(get_read_db), #pinned to the primary right after a checkout (app/core/replicas.py)
     current_user: dict = Depends(get_current_user)
 ):
     if current_user["role"] != "user":
         raise HTTPException(status_code=403, detail="Only users can view order history")
-    logger.info(f"User {current_user['id']} is retrieving order history.")
-    
-#Queries all orders belonging to the current user, ordered by most recent.
-    orders = (
-        db.query(Order)
-        .filter(Order.user_id == current_user["id"])
-        .order_by(Order.created_at.desc())
-        .all()
+    logger.info("User %s is retrieving order history.", current_user['id'])
+
+    #Only the OrderSummaryOut columns, read as an index range scan on (user_id, created_at, id):
+    #every page costs the same however many orders the user has.
+    query = (
+        select(Order.id, Order.total_price, Order.status, Order.created_at)
+        .where(Order.user_id == current_user["id"])
+        .order_by(Order.created_at.desc(), Order.id.desc())
+        .limit(limit + 1) #one extra row tells whether there is a next page
     )
-    logger.debug(f"Found {len(orders)} orders for user {current_user['id']}.")
+    if cursor:
+        query = query.where(tuple_(Order.created_at, Order.id) < tuple_(*_history_cursor_values(cursor)))
+    orders = (await db.execute(query)).mappings().all()
+    if len(orders) > limit:
+        orders = orders[:limit]
+        last = orders[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(HISTORY_CURSOR_KEY, [last["created_at"].isoformat(), last["id"]])
+    logger.debug("Found %s orders for user %s.", len(orders), current_user['id'])
 
-    return orders
+    return json_response([order_summary_out(order) for order in orders], response) #rows are already OrderSummaryOut-shaped
+
+MAX_BATCH_ORDER_IDS = 100
+
+#Several orders with their items in one call: ids=3,5,8 (comma separated, at most 100).
+#Two queries however many orders are asked for: the orders, then all their items (selectin), plus one for their
+#products when include_products=true. Ids that do not exist or belong to someone else are left out.
+#Declared before /{order_id} so "details" is not taken for an order id.
+@router.get("/details", response_model=list[OrderBatchOut])
+async def get_order_details_batch(
+    ids: str = Query(..., description="Comma-separated order ids"),
+    include_products: bool = Query(False, description="Embed product name and image_url in every item"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user["role"] != "user":
+        raise HTTPException(status_code=403, detail="Only users can view order details")
+    try:
+        order_ids = list(dict.fromkeys(int(part) for part in ids.split(",") if part.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma-separated integers")
+    if not order_ids or len(order_ids) > MAX_BATCH_ORDER_IDS:
+        raise HTTPException(status_code=400, detail=f"Pass between 1 and {MAX_BATCH_ORDER_IDS} order ids")
+    logger.info("User %s is fetching %s orders.", current_user['id'], len(order_ids))
+
+    items = selectinload(Order.items)
+    if include_products:
+        items = items.selectinload(OrderItem.product)
+    orders = (await db.execute(
+        select(Order)
+        .options(items)
+        .where(Order.id.in_(order_ids), Order.user_id == current_user["id"])
+    )).scalars().all()
+    by_id = {order.id: order for order in orders}
+    orders = [by_id[order_id] for order_id in order_ids if order_id in by_id] #in the requested order
+    if include_products:
+        return orders
+    #OrderItem.product is lazy="raise": without it, the items are shaped without reading it (product stays null)
+    return [OrderDetailOut.model_validate(order) for order in orders]
 
 #Returns detailed information about a specific order.
 @router.get("/{order_id}", response_model=OrderDetailOut)
-def get_order_detail(
+async def get_order_detail(
     order_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user)
 ):
     if current_user["role"] != "user":
         raise HTTPException(status_code=403, detail="Only users can view order details")
-    logger.info(f"User {current_user['id']} is trying to access order {order_id}.")
+    logger.info("User %s is trying to access order %s.", current_user['id'], order_id)
 
-    order = (
-        db.query(Order)
-        .filter(Order.id == order_id, Order.user_id == current_user["id"])
-        .first()
+    #items are loaded up front (selectin): lazy loading is not available in async sessions
+    order = await db.scalar(
+        select(Order)
+        .options(selectinload(Order.items))
+        .where(Order.id == order_id, Order.user_id == current_user["id"])
     )
 
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
 
     return order
+
+admin_router = APIRouter(prefix="/admin/orders", tags=["Admin Orders"])
+
+#Streams all orders with their items (NDJSON: one order per line; CSV: one line item per row), oldest first.
+#start is inclusive, end exclusive. gzip=true sends a gzip file (application/gzip, orders.<format>.gz); there is no
+#Content-Encoding header, so clients save the compressed bytes as they are instead of decoding them.
+@admin_router.get("/export")
+async def export_orders(
+    format: str = Query("ndjson", description="ndjson or csv"),
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+    status: Optional[str] = Query(None),
+    gzip: bool = Query(False),
+    current_user: dict = Depends(get_current_admin_user)
+):
+    file_format = format.lower()
+    if file_format not in FORMATS:
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    start, end = (value.replace(tzinfo=timezone.utc) if value and value.tzinfo is None else value for value in (start, end)) #naive means UTC
+    if start and end and start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    logger.info("Admin %s is exporting orders (%s, start=%s, end=%s, status=%s)", current_user.get('sub'), file_format, start, end, status)
+
+    return StreamingResponse(
+        stream_export(export_query(start, end, status), file_format, gzip),
+        media_type="application/gzip" if gzip else FORMATS[file_format],
+        headers={"Content-Disposition": f'attachment; filename="orders.{file_format}{".gz" if gzip else ""}"'},
+    )
@@ -1,7 +1,7 @@
 from datetime import datetime
 from enum import Enum
 from pydantic import BaseModel, field_validator
-from typing import Literal , List #Literal restricts a value to exactly one of the given strings.
+from typing import Literal , List, Optional #Literal restricts a value to exactly one of the given strings.
 
 class OrderStatus(str, Enum): #status according to srs
     paid = "paid"
@@ -65,3 +65,19 @@ class OrderDetailOut(BaseModel):
     model_config = {
         "from_attributes": True
     }
+
+#Product fields embedded in batch order details when include_products=true.
+class OrderItemProductOut(BaseModel):
+    name: str
+    image_url: Optional[str] = None #nullable on products
+
+    model_config = {
+        "from_attributes": True
+    }
+
+class OrderItemBatchOut(OrderItemDetailOut):
+    product: Optional[OrderItemProductOut] = None #null unless requested (or if the product no longer exists)
+
+#One order of GET /orders/details.
+class OrderBatchOut(OrderDetailOut):
+    items: List[OrderItemBatchOut]
@@ -0,0 +1,57 @@
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.products.events import on_products_changed, on_stock_changed
+from app.products.models import Product
+from app.products.schemas import ProductOut
+
+#Read-through cache of products by id, used by the public product routes.
+#Entries are ProductOut snapshots (never ORM objects), so they can outlive the session that loaded them.
+product_cache = TTLCache(maxsize=settings.PRODUCT_CACHE_MAXSIZE, ttl=settings.PRODUCT_CACHE_TTL_SECONDS)
+#Cached products whose stock moved (cart holds, checkouts): the entry is kept and only its stock fields are re-read.
+_stock_stale = set()
+
+@on_products_changed
+def _invalidate(product_ids):
+    for product_id in product_ids:
+        product_cache.invalidate(product_id)
+        _stock_stale.discard(product_id)
+
+@on_stock_changed
+def _mark_stock_stale(product_ids):
+    _stock_stale.update(product_id for product_id in product_ids if product_id in product_cache)
+
+#stock, available and the version (hence the ETag) of a cached snapshot, from a primary-key lookup of four columns.
+async def _refresh_stock(db: AsyncSession, product: ProductOut) -> Optional[ProductOut]:
+    _stock_stale.discard(product.id) #before the query: a hold committed while it runs marks the entry again
+    row = (await db.execute(
+        select(Product.stock, Product.reserved, Product.version, Product.updated_at).where(Product.id == product.id)
+    )).first()
+    if row is None:
+        product_cache.invalidate(product.id)
+        return None
+    product = product.model_copy(update={
+        "stock": row.stock,
+        "available": max(row.stock - (row.reserved or 0), 0),
+        "version": row.version,
+        "updated_at": row.updated_at,
+    })
+    product_cache.replace(product.id, product) #keeps the entry's expiry
+    return product
+
+#Returns the product from the cache, loading it from the database on a miss (None if it does not exist).
+#The stock in the snapshot is for display only: code that gates a purchase must read stock from the database.
+async def get_cached_product(db: AsyncSession, product_id: int) -> Optional[ProductOut]:
+    product = product_cache.get(product_id)
+    if product is not None and product_id in _stock_stale:
+        return await _refresh_stock(db, product)
+    if product is None:
+        _stock_stale.discard(product_id)
+        row = await db.get(Product, product_id)
+        if row is None:
+            return None
+        product = ProductOut.model_validate(row)
+        product_cache.set(product_id, product)
+    return product
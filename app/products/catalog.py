@@ -0,0 +1,284 @@
+import asyncio
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import select
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, select_by_ids
+from app.core.logger import get_logger
+from app.products.events import on_products_changed, on_stock_changed
+from app.products.models import Product
+
+try:
+    import numpy as np
+except ImportError: #optional dependency: without NumPy the public listing always queries the database
+    np = None
+
+logger = get_logger("products")
+
+#In-process columnar snapshot of the catalog for GET /products (CATALOG_SNAPSHOT_ENABLED).
+#Product fields live in NumPy arrays (categories dictionary-encoded as int codes), and the row order for every
+#sort key is precomputed, so a filtered, sorted page is a few vectorized masks and a slice instead of a database query.
+#A background job loads the snapshot and then applies the ids announced by products_changed in small incremental
+#refreshes; each refresh publishes a new immutable snapshot with a higher version. Stock moves (stock_changed: cart
+#holds, checkouts) are cheaper: they patch stock and availability of the current snapshot in place. Reads may lag writes
+#by up to CATALOG_REFRESH_SECONDS, which is fine for browsing (carts and checkout always check stock in the database).
+
+SORT_KEYS = ("id", "name", "price", "stock", "category")
+COLUMNS = (Product.id, Product.name, Product.description, Product.price, Product.stock, Product.reserved,
+           Product.category, Product.image_url, Product.sku, Product.version, Product.updated_at)
+STOCK_COLUMNS = (Product.id, Product.stock, Product.reserved, Product.version, Product.updated_at)
+COMPACT_RATIO = 0.25 #rebuild from scratch once this share of the positions hold deleted products
+
+def _output_row(row) -> dict: #the ProductOut fields of one product
+    return {
+        "id": row.id, "name": row.name, "description": row.description, "price": row.price, "stock": row.stock,
+        "category": row.category, "image_url": row.image_url, "sku": row.sku, "available": max(row.stock - (row.reserved or 0), 0),
+        "version": row.version, "updated_at": row.updated_at,
+    }
+
+#One version of the catalog, immutable except for the stock patches of CatalogSnapshot._apply_stock_changes.
+#Position i of every array (and of rows) describes the same product;
+#a deleted product keeps its position with alive[i] = False (rows[i] = None) until the next full rebuild.
+#Names and categories are ordered by code point, which may differ from the database collation (see the cursors
+#in app/products/routes.py).
+class _Snapshot:
+    def __init__(self, version: int, rows: List[Optional[dict]], categories: List[str], position: Dict[int, int]):
+        self.version = version
+        self.rows = rows
+        self.categories = categories #code -> category ("" for none); codes are shared by all snapshots
+        self.position = position #product id -> position
+        self.orders = {} #sort key -> positions of the live rows in (sort column, id) order
+        self.tombstones = 0 #positions of deleted products, counted as they are deleted
+
+    def build(self, category_codes: dict):
+        count = len(self.rows)
+        self.alive = np.ones(count, dtype=bool)
+        self.ids = np.zeros(count, dtype=np.int64)
+        self.price = np.zeros(count, dtype=np.float64)
+        self.stock = np.zeros(count, dtype=np.int64)
+        self.category = np.zeros(count, dtype=np.int32)
+        self.names = np.empty(count, dtype=object)
+        for i, row in enumerate(self.rows):
+            self.set(i, row, category_codes)
+
+    #Copies the arrays of previous, extended by `added` positions.
+    def copy_columns(self, previous: "_Snapshot", added: int):
+        for field, fill in (("alive", False), ("ids", 0), ("price", 0.0), ("stock", 0), ("category", 0), ("names", "")):
+            column = getattr(previous, field)
+            setattr(self, field, np.concatenate([column, np.full(added, fill, dtype=column.dtype)]) if added else column.copy())
+
+    def set(self, i: int, row: Optional[dict], category_codes: dict):
+        if row is None:
+            self.alive[i] = False
+            return
+        self.alive[i] = True
+        self.ids[i] = row["id"]
+        self.price[i] = row["price"]
+        self.stock[i] = row["stock"]
+        self.category[i] = category_codes[row["category"] or ""]
+        self.names[i] = row["name"] or ""
+
+    def sort(self, keys: Iterable[str]):
+        for key in keys:
+            if key == "id":
+                order = np.argsort(self.ids, kind="stable")
+            elif key == "name":
+                order = np.lexsort((self.ids, np.unique(self.names, return_inverse=True)[1]))
+            elif key == "category":
+                ranks = np.argsort(np.argsort(np.array(self.categories, dtype=object))) #code -> rank of its category string
+                order = np.lexsort((self.ids, ranks[self.category]))
+            else:
+                order = np.lexsort((self.ids, getattr(self, key)))
+            self.orders[key] = order[self.alive[order]]
+
+    #Sort column values compared against a cursor (strings as object arrays).
+    def column(self, key: str):
+        if key == "category":
+            return np.array(self.categories, dtype=object)[self.category]
+        return {"id": self.ids, "name": self.names, "price": self.price, "stock": self.stock}[key]
+
+
+class CatalogSnapshot:
+    def __init__(self):
+        self._snapshot: Optional[_Snapshot] = None
+        self._dirty_ids = set()
+        self._stock_dirty_ids = set() #only stock or reserved changed
+        self._lock = asyncio.Lock()
+        self._category_codes = {"": 0}
+        self._categories = [""]
+
+    @property
+    def ready(self) -> bool:
+        return self._snapshot is not None
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version if self._snapshot else 0
+
+    def mark_dirty(self, product_ids: Iterable[int]):
+        self._dirty_ids.update(product_ids)
+
+    def mark_stock_dirty(self, product_ids: Iterable[int]):
+        self._stock_dirty_ids.update(product_ids)
+
+    def _register_category(self, category: Optional[str]):
+        category = category or ""
+        if category not in self._category_codes:
+            self._category_codes[category] = len(self._categories)
+            self._categories.append(category)
+
+    def _full_build(self, rows: List[dict]) -> _Snapshot:
+        position = {row["id"]: i for i, row in enumerate(rows)}
+        snapshot = _Snapshot(self.version + 1, rows, list(self._categories), position)
+        snapshot.build(self._category_codes)
+        snapshot.sort(SORT_KEYS)
+        return snapshot
+
+    async def _load_all(self, db):
+        self._dirty_ids.clear() #the full load covers them; ids marked while it runs stay dirty
+        self._stock_dirty_ids.clear()
+        rows = []
+        result = await db.stream(select(*COLUMNS).order_by(Product.id).execution_options(yield_per=5000))
+        async for row in result:
+            self._register_category(row.category)
+            rows.append(_output_row(row))
+        self._snapshot = self._full_build(rows)
+        logger.info("Catalog snapshot loaded: %s products (version %s)", len(rows), self.version)
+
+    #Applies the dirty ids to a copy of the current snapshot: changed rows are patched in place, new products are
+    #appended, deleted ones are tombstoned. Only the orders of sort keys whose column changed are recomputed.
+    async def _apply_changes(self, db):
+        ids = list(self._dirty_ids)
+        self._dirty_ids.clear() #ids marked while the rows are read stay dirty
+        try:
+            found = {row.id: _output_row(row) for row in await select_by_ids(db, COLUMNS, Product.id, ids)}
+        except BaseException: #also on cancellation: the next refresh retries them
+            self._dirty_ids.update(ids)
+            raise
+        previous = self._snapshot
+
+        rows = list(previous.rows)
+        position = dict(previous.position)
+        changes = {} #position -> new row (None = deleted)
+        changed_keys = set()
+        deleted = 0
+        for product_id in ids:
+            row = found.get(product_id)
+            i = position.get(product_id)
+            if row is None:
+                if i is not None: #deleted
+                    del position[product_id]
+                    rows[i] = changes[i] = None
+                    deleted += 1
+                continue
+            self._register_category(row["category"])
+            if i is None:
+                i = position[product_id] = len(rows)
+                rows.append(row)
+                changed_keys.update(SORT_KEYS) #a new position has to be placed in every order
+            else:
+                old = rows[i]
+                changed_keys.update(key for key in SORT_KEYS if old[key] != row[key])
+            rows[i] = changes[i] = row
+
+        tombstones = previous.tombstones + deleted
+        if tombstones > COMPACT_RATIO * len(rows):
+            self._snapshot = self._full_build([row for row in rows if row is not None])
+            return
+        snapshot = _Snapshot(previous.version + 1, rows, list(self._categories), position)
+        snapshot.tombstones = tombstones
+        snapshot.copy_columns(previous, len(rows) - len(previous.rows))
+        for i, row in changes.items():
+            snapshot.set(i, row, self._category_codes)
+        for key in SORT_KEYS:
+            if key not in changed_keys: #same positions in the same order; only drop rows deleted since
+                order = previous.orders[key]
+                snapshot.orders[key] = order[snapshot.alive[order]]
+        snapshot.sort(key for key in SORT_KEYS if key in changed_keys)
+        self._snapshot = snapshot #readers switch to the new version in one assignment
+
+    #Stock moves patch the current snapshot in place instead of copying every column: the rows of the products get
+    #their new stock, availability and version, and only when stock itself moved (a checkout, not a hold) is the stock
+    #column written and the "stock" order recomputed, once for all the moves since the last refresh.
+    #query() never awaits, so a reader sees the snapshot either before or after the whole patch.
+    async def _apply_stock_changes(self, db):
+        ids = list(self._stock_dirty_ids)
+        self._stock_dirty_ids.clear()
+        try:
+            found = await select_by_ids(db, STOCK_COLUMNS, Product.id, ids)
+        except BaseException:
+            self._stock_dirty_ids.update(ids)
+            raise
+        snapshot = self._snapshot
+        stock_moved = False
+        for row in found:
+            i = snapshot.position.get(row.id)
+            if i is None: #not in the snapshot yet: products_changed brings in the whole row
+                continue
+            old = snapshot.rows[i]
+            snapshot.rows[i] = {
+                **old, "stock": row.stock, "available": max(row.stock - (row.reserved or 0), 0),
+                "version": row.version, "updated_at": row.updated_at,
+            }
+            if row.stock != old["stock"]:
+                snapshot.stock[i] = row.stock
+                stock_moved = True
+        if stock_moved:
+            snapshot.sort(["stock"])
+        snapshot.version += 1
+
+    #Background job (app/main.py): full load on the first run, then only the products that changed.
+    async def refresh(self):
+        if self.ready and not self._dirty_ids and not self._stock_dirty_ids:
+            return
+        async with self._lock:
+            async with AsyncSessionLocal() as db:
+                if not self.ready:
+                    await self._load_all(db)
+                    return
+                if self._dirty_ids:
+                    await self._apply_changes(db)
+                if self._stock_dirty_ids:
+                    await self._apply_stock_changes(db)
+
+    #One page of live products matching the filters, in (sort_key, id) order, optionally after the
+    #[sort value, id] (or [id]) of a cursor. Returns the rows (ProductOut dicts), whether more rows follow,
+    #and the snapshot version the page was read from.
+    def query(self, category: Optional[str], min_price: Optional[float], max_price: Optional[float], sort_key: str,
+              offset: int, limit: int, after: Optional[list] = None) -> Tuple[List[dict], bool, int]:
+        snapshot = self._snapshot
+        conditions = []
+        if category is not None:
+            code = self._category_codes.get(category)
+            if code is None or code >= len(snapshot.categories):
+                return [], False, snapshot.version
+            conditions.append(snapshot.category == code)
+        if min_price is not None:
+            conditions.append(snapshot.price >= min_price)
+        if max_price is not None:
+            conditions.append(snapshot.price <= max_price)
+        if after is not None:
+            if sort_key == "id":
+                conditions.append(snapshot.ids > after[0])
+            else:
+                values, value = snapshot.column(sort_key), after[0] if after[0] is not None else ""
+                conditions.append((values > value) | ((values == value) & (snapshot.ids > after[1])))
+
+        order = snapshot.orders[sort_key]
+        if conditions:
+            mask = conditions[0]
+            for condition in conditions[1:]:
+                mask &= condition
+            order = order[mask[order]]
+        page = order[offset:offset + limit + 1]
+        return [snapshot.rows[i] for i in page[:limit]], len(page) > limit, snapshot.version
+
+
+catalog = CatalogSnapshot()
+on_products_changed(catalog.mark_dirty) #admin writes and imports mark the products to refresh
+on_stock_changed(catalog.mark_stock_dirty) #cart holds and checkouts only patch stock
+
+#True when the snapshot is switched on and NumPy is installed.
+def catalog_enabled() -> bool:
+    if settings.CATALOG_SNAPSHOT_ENABLED and np is None:
+        logger.warning("CATALOG_SNAPSHOT_ENABLED is set but NumPy is not installed; product listings use the database")
+    return settings.CATALOG_SNAPSHOT_ENABLED and np is not None
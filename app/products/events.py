@@ -0,0 +1,31 @@
+from typing import Callable, Iterable, List
+
+#Products whose row changed (created, updated or deleted) are announced here,
+#so derived in-process state (cache, search index, ...) can refresh exactly those ids.
+#Changes that only move stock or reserved (cart holds, checkouts, expired holds) are announced separately
+#through stock_changed, so state that does not use stock (e.g. the search index) is left alone.
+_listeners: List[Callable[[List[int]], None]] = []
+_stock_listeners: List[Callable[[List[int]], None]] = []
+
+def on_products_changed(listener: Callable[[List[int]], None]):
+    _listeners.append(listener)
+    return listener
+
+def on_stock_changed(listener: Callable[[List[int]], None]):
+    _stock_listeners.append(listener)
+    return listener
+
+def _notify(listeners: List[Callable[[List[int]], None]], product_ids: Iterable[int]):
+    ids = list(product_ids)
+    if not ids:
+        return
+    for listener in listeners:
+        listener(ids)
+
+#Call after the transaction that changed the products has been committed.
+def products_changed(product_ids: Iterable[int]):
+    _notify(_listeners, product_ids)
+
+#Call after a committed transaction that changed only stock or reserved of the products.
+def stock_changed(product_ids: Iterable[int]):
+    _notify(_stock_listeners, product_ids)
@@ -0,0 +1,162 @@
+import asyncio
+from bisect import bisect_right
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import select, func, case, and_, literal
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, select_by_ids
+from app.core.logger import get_logger
+from app.products.events import on_products_changed, on_stock_changed
+from app.products.models import Product
+
+logger = get_logger("products")
+
+#Facets of the public catalog for faceted navigation (GET /products/facets): product count per category,
+#a price histogram over the FACET_PRICE_BUCKETS boundaries, and how many products are in stock (available > 0).
+#Unfiltered facets come from in-process aggregates that are loaded once and then patched with the ids announced
+#by products_changed (admin writes, imports) and stock_changed (cart holds, checkouts). Filtered facets are one grouped query.
+
+def _bucket_edges() -> List[float]:
+    return sorted({float(value) for value in settings.FACET_PRICE_BUCKETS.split(",") if value.strip()})
+
+BUCKET_EDGES = _bucket_edges() #bucket i holds prices in [edges[i-1], edges[i]); the last one is open-ended
+
+def bucket_of(price: float) -> int:
+    return bisect_right(BUCKET_EDGES, price or 0)
+
+#SQL expression with the same bucket numbering as bucket_of.
+def _bucket_column():
+    if not BUCKET_EDGES:
+        return literal(0)
+    return case(*((Product.price < edge, i) for i, edge in enumerate(BUCKET_EDGES)), else_=len(BUCKET_EDGES))
+
+_in_stock = Product.stock - func.coalesce(Product.reserved, 0) > 0
+
+def _price_buckets(counts: Dict[int, int]) -> List[dict]:
+    bounds = [0.0] + BUCKET_EDGES
+    return [
+        {"min": bounds[i], "max": BUCKET_EDGES[i] if i < len(BUCKET_EDGES) else None, "count": counts.get(i, 0)}
+        for i in range(len(bounds))
+    ]
+
+def _facets(total: int, categories: Counter, buckets: Counter, in_stock: int) -> dict:
+    return {
+        "total": total,
+        "categories": [{"category": category, "count": count} for category, count in sorted(categories.items()) if count],
+        "price_buckets": _price_buckets(buckets),
+        "in_stock": in_stock,
+    }
+
+
+class FacetAggregates:
+    def __init__(self):
+        self._lock = asyncio.Lock()
+        self._entries: Dict[int, Tuple[str, int, bool, float]] = {} #product_id -> (category, price bucket, in stock, price)
+        self._categories = Counter()
+        self._buckets = Counter()
+        self._in_stock = 0
+        self._loaded = False
+        self._dirty_ids = set()
+
+    def mark_dirty(self, product_ids: Iterable[int]):
+        self._dirty_ids.update(product_ids)
+
+    def _remove(self, product_id: int):
+        entry = self._entries.pop(product_id, None)
+        if entry is None:
+            return
+        category, bucket, in_stock, _ = entry
+        self._categories[category] -= 1
+        self._buckets[bucket] -= 1
+        self._in_stock -= in_stock
+
+    def _add(self, product_id: int, category: Optional[str], price: float, stock: int, reserved: Optional[int]):
+        self._remove(product_id)
+        entry = (category or "", bucket_of(price), stock - (reserved or 0) > 0, price or 0)
+        self._entries[product_id] = entry
+        self._categories[entry[0]] += 1
+        self._buckets[entry[1]] += 1
+        self._in_stock += entry[2]
+
+    #Reads from the primary, like the search index: replica lag must not be baked into the aggregates.
+    async def _sync(self):
+        async with AsyncSessionLocal() as db:
+            await self._load(db)
+
+    async def _load(self, db: AsyncSession):
+        columns = (Product.id, Product.category, Product.price, Product.stock, Product.reserved)
+        if not self._loaded:
+            self._dirty_ids.clear() #the full load below covers them; ids marked while it runs stay dirty
+            result = await db.stream(select(*columns).execution_options(yield_per=5000))
+            async for row in result:
+                self._add(*row)
+            self._loaded = True
+            logger.info("Facet aggregates loaded: %s products", len(self._entries))
+        elif self._dirty_ids:
+            ids = list(self._dirty_ids)
+            self._dirty_ids.clear() #ids marked while the rows are read stay dirty
+            try:
+                rows = await select_by_ids(db, columns, Product.id, ids)
+            except BaseException: #also on cancellation: the next call retries them
+                self._dirty_ids.update(ids)
+                raise
+            found = set()
+            for row in rows:
+                self._add(*row)
+                found.add(row[0])
+            for product_id in set(ids) - found: #deleted products
+                self._remove(product_id)
+
+    #Facets of the whole catalog; only products changed since the last call are read from the primary.
+    async def unfiltered(self) -> dict:
+        async with self._lock:
+            await self._sync()
+            return _facets(len(self._entries), self._categories, self._buckets, self._in_stock)
+
+    #Facets of the given products narrowed by the GET /products filters, counted from the aggregates' entries.
+    #Used for the matches of the in-process search index, which may be far more ids than fit in an IN list.
+    async def for_ids(self, product_ids: Iterable[int], category: Optional[str], min_price: Optional[float],
+                      max_price: Optional[float]) -> dict:
+        async with self._lock:
+            await self._sync()
+            categories, buckets, total, in_stock = Counter(), Counter(), 0, 0
+            for product_id in product_ids:
+                entry = self._entries.get(product_id)
+                if entry is None:
+                    continue
+                entry_category, bucket, entry_in_stock, price = entry
+                if (category and entry_category != category) or (min_price is not None and price < min_price) \
+                        or (max_price is not None and price > max_price):
+                    continue
+                categories[entry_category] += 1
+                buckets[bucket] += 1
+                total += 1
+                in_stock += entry_in_stock
+            return _facets(total, categories, buckets, in_stock)
+
+
+facet_aggregates = FacetAggregates()
+on_products_changed(facet_aggregates.mark_dirty)
+on_stock_changed(facet_aggregates.mark_dirty) #in_stock
+
+#Facets of the products matching the filters (conditions: SQL expressions on Product), in one query grouped by
+#(category, price bucket); the three facets are folded from those few rows.
+async def filtered_facets(db: AsyncSession, conditions: list) -> dict:
+    query = (
+        select(
+            func.coalesce(Product.category, "").label("facet_category"),
+            _bucket_column().label("facet_bucket"),
+            func.count(),
+            func.sum(case((_in_stock, 1), else_=0)),
+        )
+        .where(and_(*conditions))
+        .group_by("facet_category", "facet_bucket") #by label: the expressions carry bound parameters
+    )
+    categories, buckets, total, in_stock = Counter(), Counter(), 0, 0
+    for row_category, row_bucket, count, row_in_stock in await db.execute(query):
+        categories[row_category] += count
+        buckets[row_bucket] += count
+        total += count
+        in_stock += row_in_stock or 0
+    return _facets(total, categories, buckets, in_stock)
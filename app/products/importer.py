@@ -0,0 +1,173 @@
+import codecs
+import csv
+import json
+from datetime import datetime, timezone
+from typing import AsyncIterator, List, Optional
+from pydantic import ValidationError
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.database import dialect_insert
+from app.core.logger import get_logger
+from app.products.events import products_changed
+from app.products.models import Product
+from app.products.schemas import ProductCreate
+
+logger = get_logger("products")
+
+#Streaming bulk import: the upload is decoded and parsed line by line while it arrives, validated against
+#ProductCreate, and upserted by sku in multi-row batches (one INSERT ... ON CONFLICT DO UPDATE per batch, one commit per batch).
+#Memory use is bounded by the batch size, not the file size.
+
+FORMATS = ("csv", "ndjson")
+UPDATED_COLUMNS = ("name", "description", "price", "stock", "category", "image_url") #reserved stock is never touched
+
+#Per-import counters and the per-row error report returned to the caller.
+class ImportReport:
+    def __init__(self, max_errors: int):
+        self.rows = 0
+        self.upserted = 0
+        self.failed = 0
+        self.errors = []
+        self.max_errors = max_errors
+
+    def error(self, row: int, sku: Optional[str], messages: List[str]):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"row": row, "sku": sku, "errors": messages})
+
+    def as_dict(self) -> dict:
+        return {
+            "rows": self.rows,
+            "upserted": self.upserted,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+#Picks the upload format from ?format= or the Content-Type header.
+def detect_format(requested: Optional[str], content_type: Optional[str]) -> Optional[str]:
+    if requested:
+        return requested.lower() if requested.lower() in FORMATS else None
+    content_type = (content_type or "").lower()
+    if "csv" in content_type:
+        return "csv"
+    if "ndjson" in content_type or "jsonl" in content_type or "x-ndjson" in content_type:
+        return "ndjson"
+    return None
+
+#Decodes the byte stream incrementally and yields complete lines (a multi-byte character may span chunks).
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+#Yields (row number, field dict or parse error). A quoted CSV field may contain newlines, so lines are joined
+#until the quotes balance before the record is parsed.
+async def _csv_records(lines: AsyncIterator[str]):
+    header = None
+    record = ""
+    row = 0
+    async for line in lines:
+        record = f"{record}\n{line}" if record else line
+        if record.count('"') % 2:
+            continue
+        text, record = record.rstrip("\r"), ""
+        if not text.strip():
+            continue
+        values = next(csv.reader([text]))
+        if header is None:
+            header = [name.strip().lower() for name in values]
+            continue
+        row += 1
+        if len(values) != len(header):
+            yield row, f"expected {len(header)} fields, got {len(values)}"
+        else:
+            yield row, dict(zip(header, values))
+    if record:
+        row += 1
+        yield row, "unterminated quoted field"
+
+async def _ndjson_records(lines: AsyncIterator[str]):
+    row = 0
+    async for line in lines:
+        if not line.strip():
+            continue
+        row += 1
+        try:
+            value = json.loads(line)
+        except ValueError as e:
+            yield row, f"invalid JSON: {e}"
+            continue
+        yield row, value if isinstance(value, dict) else "expected a JSON object"
+
+def _validate(row: int, fields, report: ImportReport) -> Optional[dict]:
+    if isinstance(fields, str):
+        report.error(row, None, [fields])
+        return None
+    sku = fields.get("sku")
+    if not sku:
+        report.error(row, None, ["sku is required for import"])
+        return None
+    try:
+        product = ProductCreate.model_validate(fields)
+    except ValidationError as e:
+        report.error(row, str(sku), [f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in e.errors()])
+        return None
+    return product.model_dump()
+
+def _upsert_statement(db: AsyncSession, rows: List[dict]):
+    statement = dialect_insert(db, Product).values(rows)
+    return statement.on_conflict_do_update(
+        index_elements=[Product.sku],
+        set_={
+            **{column: statement.excluded[column] for column in UPDATED_COLUMNS},
+            "version": Product.version + 1,
+            "updated_at": datetime.now(timezone.utc),
+        },
+    ).returning(Product.id)
+
+#Upserts one batch; if the batch is rejected by the database, its rows are retried one by one to find the bad ones.
+async def _write_batch(db: AsyncSession, batch: dict, report: ImportReport):
+    rows = list(batch.values()) #keyed by sku, so a sku repeated within the batch is written once (last row wins)
+    try:
+        ids = (await db.execute(_upsert_statement(db, [data for _, data in rows]))).scalars().all()
+        await db.commit()
+    except DBAPIError:
+        await db.rollback()
+        ids = []
+        for row, data in rows:
+            try:
+                ids += (await db.execute(_upsert_statement(db, [data]))).scalars().all()
+                await db.commit()
+            except DBAPIError as e:
+                await db.rollback()
+                report.error(row, data["sku"], [str(e.orig)])
+    report.upserted += len(ids)
+    products_changed(ids)
+
+async def import_products(db: AsyncSession, chunks: AsyncIterator[bytes], file_format: str) -> dict:
+    report = ImportReport(settings.PRODUCT_IMPORT_MAX_ERRORS)
+    lines = _lines(chunks)
+    records = _csv_records(lines) if file_format == "csv" else _ndjson_records(lines)
+    batch = {}
+    async for row, fields in records:
+        report.rows += 1
+        data = _validate(row, fields, report)
+        if data is None:
+            continue
+        batch[data["sku"]] = (row, data)
+        if len(batch) >= settings.PRODUCT_IMPORT_BATCH_SIZE:
+            await _write_batch(db, batch, report)
+            batch = {}
+    if batch:
+        await _write_batch(db, batch, report)
+    logger.info("Product import finished: %s rows, %s upserted, %s failed", report.rows, report.upserted, report.failed)
+    return report.as_dict()
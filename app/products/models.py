@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float # SQLAlchemy classes to define table columns and their data types.
+from sqlalchemy import Column, Integer, String, Float, Index, DateTime, func, literal_column # SQLAlchemy classes to define table columns and their data types.
+from datetime import datetime, timezone
 from app.core.database import Base
 
 class Product(Base):
@@ -11,4 +12,52 @@ class Product(Base):
     stock = Column(Integer, nullable=False)
     category = Column(String)
     image_url = Column(String)
-    
+    reserved = Column(Integer, nullable=False, default=0, server_default="0") #units held by active cart reservations
+    sku = Column(String, nullable=True) #natural key used by the bulk import (unique when set)
+    #Bumped by every UPDATE of the row, ORM or bulk (onupdate applies to both), and used for ETags.
+    #ON CONFLICT upserts skip onupdate, so the import sets both columns itself.
+    version = Column(Integer, nullable=False, default=1, server_default="1", onupdate=literal_column("version + 1"))
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+
+    @property
+    def available(self) -> int: #stock that can still be added to a cart
+        return max(self.stock - (self.reserved or 0), 0)
+
+    #Composite indexes for keyset pagination: one (sort column, id) index per allowed sort_by value,
+    #also prefixed with category because listings are usually filtered by category.
+    __table_args__ = (
+        Index("ix_products_name_id", "name", "id"),
+        Index("ix_products_price_id", "price", "id"),
+        Index("ix_products_stock_id", "stock", "id"),
+        Index("ix_products_category_id", "category", "id"),
+        Index("ix_products_category_name_id", "category", "name", "id"),
+        Index("ix_products_category_price_id", "category", "price", "id"),
+        Index("ix_products_category_stock_id", "category", "stock", "id"),
+        Index("ux_products_sku", "sku", unique=True), #also the conflict target of the import upsert
+    )
+
+#Sort key of sort_by=category: NULL sorts as "" so keyset cursors never hold a NULL (a row-value comparison with
+#NULL is never true) and NULLs sort the same way on every database and in the catalog snapshot.
+category_sort_key = func.coalesce(Product.category, literal_column("''"))
+Index("ix_products_category_sort_id", category_sort_key, Product.id)
+
+#Weighted full-text document used by the PostgreSQL search backend (A = name, B = category, C = description).
+#The same expression backs the GIN index below, so search queries must use it unchanged for the index to be picked.
+def _weighted_vector(column, weight):
+    return func.setweight(
+        func.to_tsvector(literal_column("'simple'"), func.coalesce(column, literal_column("''"))),
+        literal_column(f"'{weight}'")
+    )
+
+search_document = (
+    _weighted_vector(Product.name, "A")
+    .op("||")(_weighted_vector(Product.category, "B"))
+    .op("||")(_weighted_vector(Product.description, "C"))
+)
+
+#PostgreSQL only: tsvector index for word/prefix search and trigram index for substring matches on the name.
+Index("ix_products_search_document", search_document, postgresql_using="gin").ddl_if(dialect="postgresql")
+Index(
+    "ix_products_name_trgm", Product.name,
+    postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}
+).ddl_if(dialect="postgresql")
@@ -1,50 +1,158 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query #APIRouter: Used to create route groups
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response, Request #APIRouter: Used to create route groups
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from sqlalchemy import or_, asc #or_: For combining multiple filter conditions using OR, asc-ascending order
-from app.core.database import get_db #Provides the database session through FastAPI's dependency system.
-from app.products.models import Product
-from app.products.schemas import ProductCreate, ProductOut, ProductUpdate
+from sqlalchemy import select, asc, tuple_ #asc-ascending order, tuple_: row-value comparison for keyset pagination
+from sqlalchemy.exc import IntegrityError
+from app.core.database import get_async_db #Provides the async database session through FastAPI's dependency system.
+from app.core.replicas import get_read_db, open_read_session, read_router #read-only session on a replica (or the primary), used by the public routes
+from app.products.models import Product, category_sort_key
+from app.products.schemas import ProductCreate, ProductOut, ProductUpdate, ProductFacetsOut
+from app.products.search import search_index
+from app.products.cache import get_cached_product
+from app.products.events import products_changed #invalidates the product cache and refreshes the search index
+from app.products.importer import import_products, detect_format
+from app.products.catalog import catalog
+from app.products.facets import facet_aggregates, filtered_facets
 from app.auth.jwt_handler import get_current_admin_user #Verifies the admin user based on JWT token.
 from app.orders.models import OrderItem # Model for checking if a product is part of an order before deleting.
+from app.utils.cursor_utils import encode_cursor, decode_cursor, cursor_sort_key
+from app.utils.serialization import json_response, product_out, product_row_out
+from app.utils.http_cache import product_etag, list_etag, is_conditional, not_modified, not_modified_response, set_cache_headers
+
+#Columns allowed in sort_by; each one has a matching (column, id) index in app/products/models.py.
+SORT_COLUMNS = {
+    "id": Product.id,
+    "name": Product.name,
+    "price": Product.price,
+    "stock": Product.stock,
+    "category": category_sort_key, #coalesced, backed by ix_products_category_sort_id
+}
+#JSON type of the sort value stored in a cursor, per sort key (the id follows it).
+CURSOR_VALUE_TYPES = {"name": str, "price": (int, float), "stock": int, "category": str}
+CURSOR_DESCRIPTION = "Opaque cursor from the X-Next-Cursor header of the previous page. When given, page/skip is ignored."
+
+#Keyset pagination: continues after the (sort value, id) pair stored in the cursor instead of using OFFSET,
+#so every page is an index range scan that costs the same as the first one.
+#Cursors hold [id], or [sort value, id] with "" for no category, for the database and the catalog snapshot alike.
+#The snapshot orders names and categories by code point and the database by its collation, so a cursor is only
+#continued by the source that issued it: snapshot cursors store their sort key as "catalog:<sort key>".
+CATALOG_CURSOR_PREFIX = "catalog:"
+
+def _cursor_key(sort_key: str, from_catalog: bool) -> str:
+    return CATALOG_CURSOR_PREFIX + sort_key if from_catalog else sort_key
+
+def _is_catalog_cursor(cursor: str) -> bool:
+    return (cursor_sort_key(cursor) or "").startswith(CATALOG_CURSOR_PREFIX)
+
+def _cursor_values(cursor: str, sort_key: str, from_catalog: bool = False) -> list:
+    key = _cursor_key(sort_key, from_catalog)
+    if sort_key == "id":
+        return decode_cursor(cursor, key, 1)
+    values = decode_cursor(cursor, key, 2)
+    if not isinstance(values[0], CURSOR_VALUE_TYPES[sort_key]):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+def _cursor_for(sort_key: str, product_id: int, value, from_catalog: bool = False) -> str:
+    values = [product_id] if sort_key == "id" else [value if value is not None else "", product_id]
+    return encode_cursor(_cursor_key(sort_key, from_catalog), values)
+
+def _after_cursor(query, cursor: str, sort_key: str):
+    values = _cursor_values(cursor, sort_key)
+    if sort_key == "id":
+        return query.where(Product.id > values[0])
+    return query.where(tuple_(SORT_COLUMNS[sort_key], Product.id) > tuple_(*values))
+
+#Fetches one row more than requested to know whether a next page exists, and sets the X-Next-Cursor header.
+async def _fetch_page(db: AsyncSession, query, limit: int, sort_key: str, response: Response) -> list:
+    rows = (await db.execute(query.limit(limit + 1))).scalars().all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers["X-Next-Cursor"] = _cursor_for(sort_key, last.id, getattr(last, sort_key, None))
+    return rows
+
+#Sets the ETag and Cache-Control of a page of products from its (id, version) pairs and next-page cursor.
+#Returns a 304 response instead when the client's copy is still current, so the page is never serialized.
+def _conditional_page(request: Request, response: Response, pairs) -> Optional[Response]:
+    etag = list_etag(pairs, response.headers.get("X-Next-Cursor"))
+    if not_modified(request, etag):
+        return not_modified_response(etag)
+    set_cache_headers(response, etag)
+    return None
+
+#Commits a product write; a duplicate sku (the only unique column besides id) becomes a 400.
+async def _commit_unique_sku(db: AsyncSession):
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="A product with this SKU already exists")
 
 #Tags for Swagger UI grouping.
 admin_router = APIRouter(prefix="/admin/products", tags=["Admin Products"]) #Secured endpoints for admins only 
 #admin can create a product.
 @admin_router.post("", response_model=ProductOut, status_code=status.HTTP_201_CREATED) 
 #Takes a ProductCreate body.add product to db . returns the created product with an auto-generated id.
-def create_product(
+async def create_product(
     product_in: ProductCreate,
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_admin_user)
 ):
     #Converts Pydantic model to dictionary and unpacks to create a Product object.
     product = Product(**product_in.model_dump()) #dict() was deprecated so used model_dump()
     db.add(product)
-    db.commit()
-    db.refresh(product)
+    await _commit_unique_sku(db)
+    await db.refresh(product)
+    products_changed([product.id])
+    read_router.pin_to_primary(request, response) #the admin's next listing must include the new product
     #Saves the product to the database and retrieves the updated object with the generated id
     return product
 
+#Bulk import/upsert by sku from a CSV (header row: sku,name,description,price,stock,category,image_url) or NDJSON upload.
+#The body is streamed and written in batches; returns counts and a per-row error report (row = data row number).
+@admin_router.post("/import")
+async def import_products_bulk(
+    request: Request,
+    response: Response,
+    format: Optional[str] = Query(None, description="csv or ndjson; defaults to the Content-Type"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(get_current_admin_user)
+):
+    file_format = detect_format(format, request.headers.get("content-type"))
+    if file_format is None:
+        raise HTTPException(status_code=415, detail="Upload CSV (text/csv) or NDJSON (application/x-ndjson), or pass ?format=csv|ndjson")
+    result = await import_products(db, request.stream(), file_format)
+    read_router.pin_to_primary(request, response)
+    return result
+
 @admin_router.get("", response_model=List[ProductOut])
-#Returns a paginated list of products.
-def list_products(
+#Returns a paginated list of products (by id). Pass the X-Next-Cursor header value as cursor for the next page.
+async def list_products(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(None, description=CURSOR_DESCRIPTION),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_admin_user)
 ):
-    products = db.query(Product).offset(skip).limit(limit).all() #offset:Tells the database how many records to skip
-    return products
+    query = select(Product).order_by(Product.id.asc())
+    if cursor:
+        query = _after_cursor(query, cursor, "id")
+    else:
+        query = query.offset(skip) #offset:Tells the database how many records to skip (kept for backward compatibility)
+    return await _fetch_page(db, query, limit, "id", response)
 
 @admin_router.get("/{product_id}", response_model=ProductOut)
 #Get Product by ID
-def get_product(
+async def get_product(
     product_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_admin_user) #do admin authentication
 ):
-    product = db.query(Product).filter(Product.id == product_id).first() #Fetches the product by ID.
+    product = await db.get(Product, product_id) #Fetches the product by ID.
 
     if not product:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
@@ -52,103 +160,181 @@ def get_product(
 
 @admin_router.put("/{product_id}", response_model=ProductOut)
 #updates the product by id
-def update_product(
+async def update_product(
     product_id: int,
     product_in: ProductUpdate,
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_admin_user)
 ):
-    product = db.query(Product).filter(Product.id == product_id).first() 
+    product = await db.get(Product, product_id)
     if not product:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
     
-    for key, value in product_in.model_dump().items():
+    data = product_in.model_dump()
+    if "sku" not in product_in.model_fields_set: #an update without sku keeps the existing one
+        data.pop("sku")
+    for key, value in data.items():
         setattr(product, key, value)
     
-    db.commit()
-    db.refresh(product)
+    await _commit_unique_sku(db)
+    await db.refresh(product)
+    products_changed([product.id])
+    read_router.pin_to_primary(request, response)
     return product
 
 @admin_router.delete("/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_product(
+async def delete_product(
     product_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_admin_user)
 ):
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = await db.get(Product, product_id)
     #checkpoint if a product is assosiated with certain order
     if not product:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
-    if db.query(OrderItem).filter(OrderItem.product_id == product.id).first():
+    if (await db.execute(select(OrderItem.id).where(OrderItem.product_id == product.id).limit(1))).first():
         raise HTTPException(
         status_code=400,
         detail="Cannot delete product that is part of an existing order."
         
     )
 
-    db.delete(product)
-    db.commit()
+    await db.delete(product)
+    await db.commit()
+    products_changed([product_id])
+    read_router.pin_to_primary(request, response)
     return None
 
 #public APIs 
+#The listing and search routes return rows pre-shaped as ProductOut through json_response (app/utils/serialization.py),
+#skipping a second validation of every row; response_model still documents the body.
 public_router = APIRouter(tags=["Public Products"])
 
 @public_router.get("/products", response_model=List[ProductOut])
-def list_products_public(
+async def list_products_public(
+    request: Request,
+    response: Response,
     category: Optional[str] = Query(None),
     min_price: Optional[float] = Query(None, ge=0),
     max_price: Optional[float] = Query(None, ge=0),
     sort_by: Optional[str] = Query("id"),
     page: int = Query(1, ge=1),
     page_size: int = Query(10, ge=1, le=100),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(None, description=CURSOR_DESCRIPTION),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    query = db.query(Product)
+    sort_key = sort_by if sort_by in SORT_COLUMNS else "id" #unknown columns fall back to id
+
+    #Served from the in-memory catalog snapshot once it is loaded (CATALOG_SNAPSHOT_ENABLED), without a database query.
+    #A cursor keeps its listing on the source that issued it (see CATALOG_CURSOR_PREFIX).
+    from_catalog = _is_catalog_cursor(cursor) if cursor else catalog.ready
+    if from_catalog and not catalog.ready:
+        raise HTTPException(status_code=400, detail="Cursor is no longer valid, start again from the first page")
+    if from_catalog:
+        rows, has_more, version = catalog.query(
+            category or None, min_price, max_price, sort_key,
+            offset=0 if cursor else (page - 1) * page_size,
+            limit=page_size,
+            after=_cursor_values(cursor, sort_key, from_catalog=True) if cursor else None,
+        )
+        response.headers["X-Catalog-Version"] = str(version)
+        if has_more:
+            last = rows[-1]
+            response.headers["X-Next-Cursor"] = _cursor_for(sort_key, last["id"], last[sort_key], from_catalog=True)
+        return _conditional_page(request, response, ((row["id"], row["version"]) for row in rows)) or json_response([product_row_out(row) for row in rows], response)
+
+    query = select(Product)
 #Supports filtering by category, price range.
     if category:
-        query = query.filter(Product.category == category)
+        query = query.where(Product.category == category)
     if min_price is not None:
-        query = query.filter(Product.price >= min_price)
+        query = query.where(Product.price >= min_price)
     if max_price is not None:
-        query = query.filter(Product.price <= max_price)
+        query = query.where(Product.price <= max_price)
 
-    sort_column = getattr(Product, sort_by, None)
-    if not sort_column:
-        sort_column = Product.id
+    query = query.order_by(asc(SORT_COLUMNS[sort_key]), asc(Product.id)) #id breaks ties so the order is stable
 
-    query = query.order_by(asc(sort_column))
-    offset = (page - 1) * page_size
-    products = query.offset(offset).limit(page_size).all()
-    return products
+    if cursor:
+        query = _after_cursor(query, cursor, sort_key)
+    else:
+        query = query.offset((page - 1) * page_size) #page numbers still work, but deep pages are slower than cursors
+    products = await _fetch_page(db, query, page_size, sort_key, response)
+    return _conditional_page(request, response, ((product.id, product.version) for product in products)) or json_response([product_out(product) for product in products], response)
 
 @public_router.get("/products/search", response_model=List[ProductOut])
-def search_products_public(
+async def search_products_public(
+    request: Request,
+    response: Response,
     keyword: str = Query(..., min_length=1),
     page: int = Query(1, ge=1),
     page_size: int = Query(10, ge=1, le=100),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    #Searches across name, description, and category using case-insensitive matching using islike function.
-    query = db.query(Product).filter(
-        or_(
-            Product.name.ilike(f"%{keyword}%"),
-            Product.description.ilike(f"%{keyword}%"),
-            Product.category.ilike(f"%{keyword}%")
-        )
-    ).order_by(Product.id.asc())
-
+    #Searches name, category and description through the configured search index (see app/products/search.py).
+    #Results are ranked by relevance: name hits weigh more than category hits, which weigh more than description hits.
     offset = (page - 1) * page_size
-    products = query.offset(offset).limit(page_size).all()
+    products = await search_index.search(db, keyword, offset, page_size)
     # #checkpoint if a product is not found for a certain keyword
     if not products:
         raise HTTPException(status_code=404, detail="No products found matching the keyword.")
-    return products
+    return _conditional_page(request, response, ((product.id, product.version) for product in products)) or json_response([product_out(product) for product in products], response)
+
+#Category counts, price histogram and in-stock count of the products matching the filters (same filters as
+#GET /products, plus a search keyword). Without filters the answer comes from precomputed aggregates.
+#Declared before /products/{product_id} so "facets" is not taken for a product id.
+@public_router.get("/products/facets", response_model=ProductFacetsOut)
+async def product_facets(
+    category: Optional[str] = Query(None),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    keyword: Optional[str] = Query(None, min_length=1),
+    db: AsyncSession = Depends(get_read_db),
+):
+    if keyword:
+        matches = await search_index.matching_ids(db, keyword)
+        if matches is not None: #in-process index: every match is counted, not just the ones condition() would list
+            return await facet_aggregates.for_ids(matches, category, min_price, max_price)
+    conditions = []
+    if category:
+        conditions.append(Product.category == category)
+    if min_price is not None:
+        conditions.append(Product.price >= min_price)
+    if max_price is not None:
+        conditions.append(Product.price <= max_price)
+    if keyword:
+        conditions.append(await search_index.condition(db, keyword))
+    if not conditions:
+        return await facet_aggregates.unfiltered()
+    return await filtered_facets(db, conditions)
 
 @public_router.get("/products/{product_id}", response_model=ProductOut)
 #to get product by id
-def get_product_public(product_id: int, db: Session = Depends(get_db)):
-    product = db.query(Product).filter(Product.id == product_id).first()
+#The cache is filled from the primary (db connects only on a cache miss), so replica lag never gets cached.
+async def get_product_public(
+    product_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+):
+    #revalidation (If-None-Match / If-Modified-Since) only needs the version: a primary-key lookup of two columns,
+    #on a read session opened for it alone (plain requests served from the cache never connect)
+    if is_conditional(request):
+        read_db = await open_read_session(request)
+        try:
+            current = (await read_db.execute(select(Product.version, Product.updated_at).where(Product.id == product_id))).first()
+        finally:
+            await read_db.close()
+        if current is not None:
+            etag = product_etag(product_id, current.version)
+            if not_modified(request, etag, current.updated_at):
+                return not_modified_response(etag, current.updated_at)
+    product = await get_cached_product(db, product_id) #served from the product cache when possible
     #checkpoint if a product is not found
     if not product:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+    set_cache_headers(response, product_etag(product.id, product.version), product.updated_at)
     return product
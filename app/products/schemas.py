@@ -1,4 +1,6 @@
-from pydantic import BaseModel # used to Validate input data
+from pydantic import BaseModel, Field # used to Validate input data
+from datetime import datetime
+from typing import List, Optional
 
 class ProductBase(BaseModel): #Other models will inherit from this to avoid repeating fields.
     name: str
@@ -7,6 +9,7 @@ class ProductBase(BaseModel): #Other models will inherit from this to avoid repe
     stock: int
     category: str
     image_url: str
+    sku: Optional[str] = None #stock keeping unit, the natural key of the bulk import
 
 class ProductCreate(ProductBase): #For Creating Products
     pass
@@ -16,7 +19,26 @@ class ProductUpdate(ProductBase):#For Updating Products
 
 class ProductOut(ProductBase):#Represents the product format used in API responses
     id: int
+    available: int #stock minus units reserved in carts
+    #not part of the response body: they travel with cached snapshots to build the ETag and Last-Modified headers
+    version: int = Field(0, exclude=True)
+    updated_at: Optional[datetime] = Field(None, exclude=True)
 
     model_config = {
         "from_attributes": True #This enables FastAPI to automatically convert SQLAlchemy objects (or similar) into this model using attribute access.
         }
+
+class CategoryFacet(BaseModel):
+    category: str
+    count: int
+
+class PriceBucket(BaseModel): #prices in [min, max); max is None for the last bucket
+    min: float
+    max: Optional[float]
+    count: int
+
+class ProductFacetsOut(BaseModel): #facets of the products matching the filters of GET /products/facets
+    total: int
+    categories: List[CategoryFacet]
+    price_buckets: List[PriceBucket]
+    in_stock: int #products with available > 0
@@ -0,0 +1,217 @@
+import asyncio
+import re
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Iterable, List, Optional
+from sqlalchemy import select, func, literal_column, or_, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.database import engine, AsyncSessionLocal, select_by_ids
+from app.products.events import on_products_changed
+from app.products.models import Product, search_document
+
+#Relative weight of a keyword hit in each field (mirrors the A/B/C weights of the PostgreSQL search document).
+FIELD_WEIGHTS = {"name": 3.0, "category": 2.0, "description": 1.0}
+PREFIX_MATCH_FACTOR = 0.5 #a prefix hit ("lap" -> "laptop") ranks below an exact word hit
+
+_TOKEN_RE = re.compile(r"\w+")
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall((text or "").lower())
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+#Common interface of the search backends used by the public search endpoint.
+class SearchIndex(ABC):
+    #Called after products are created, updated or deleted; backends kept up to date by the database ignore it.
+    def mark_dirty(self, product_ids: Iterable[int]):
+        pass
+
+    #Returns the SQL condition selecting every product that matches the keyword.
+    @abstractmethod
+    async def condition(self, db: AsyncSession, keyword: str):
+        ...
+
+    #Returns the ids of every product that matches the keyword when the backend knows them in process,
+    #or None when only the database can tell (then use condition()).
+    async def matching_ids(self, db: AsyncSession, keyword: str) -> Optional[List[int]]:
+        return None
+
+    #Returns one page of matching products, best match first.
+    @abstractmethod
+    async def search(self, db: AsyncSession, keyword: str, offset: int, limit: int) -> List[Product]:
+        ...
+
+
+#Uses the tsvector and trigram GIN indexes declared in app/products/models.py.
+#PostgreSQL keeps both indexes up to date by itself, so admin writes need no extra work.
+class PostgresSearchIndex(SearchIndex):
+    def _tsquery(self, keyword: str):
+        terms = tokenize(keyword)
+        #every word must match, each one as a prefix (e.g. "blue lap" -> "blue:* & lap:*")
+        return func.to_tsquery(literal_column("'simple'"), " & ".join(f"{term}:*" for term in terms))
+
+    def _condition(self, keyword: str):
+        return or_(
+            search_document.op("@@")(self._tsquery(keyword)),
+            Product.name.ilike(f"%{_escape_like(keyword)}%", escape="\\") #served by the trigram index
+        )
+
+    async def condition(self, db: AsyncSession, keyword: str):
+        return self._condition(keyword)
+
+    async def search(self, db: AsyncSession, keyword: str, offset: int, limit: int) -> List[Product]:
+        if not tokenize(keyword):
+            return []
+        rank = func.ts_rank(search_document, self._tsquery(keyword)) + func.similarity(Product.name, keyword)
+        query = (
+            select(Product)
+            .where(self._condition(keyword))
+            .order_by(rank.desc(), Product.id.asc())
+            .offset(offset)
+            .limit(limit)
+        )
+        return (await db.execute(query)).scalars().all()
+
+
+#In-process inverted index for SQLite and test setups.
+#It is built from the products table on first use; ids marked dirty by admin writes are re-read lazily before the next search.
+#Each worker has its own copy and only hears about its own writes, so it is meant for a single worker: with several,
+#another worker's writes show up after the full reload done every SEARCH_INDEX_RESYNC_SECONDS.
+#Use SEARCH_BACKEND=postgres for multi-worker deployments.
+class InMemorySearchIndex(SearchIndex):
+    def __init__(self):
+        self._lock = asyncio.Lock() #serializes index refreshes; lookups run on the event loop
+        self._postings = {} #token -> {product_id: field weight}
+        self._doc_tokens = {} #product_id -> tokens indexed for it
+        self._sorted_tokens = [] #sorted vocabulary, used for prefix lookups
+        self._vocabulary_changed = False
+        self._loaded = False
+        self._loaded_at = 0.0
+        self._dirty_ids = set()
+
+    def mark_dirty(self, product_ids: Iterable[int]):
+        self._dirty_ids.update(product_ids)
+
+    def _stale(self) -> bool:
+        return settings.SEARCH_INDEX_RESYNC_SECONDS > 0 and time.monotonic() - self._loaded_at > settings.SEARCH_INDEX_RESYNC_SECONDS
+
+    def _remove(self, product_id: int):
+        for token in self._doc_tokens.pop(product_id, ()):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[token]
+                self._vocabulary_changed = True
+
+    def _add(self, product_id: int, name: str, category: str, description: str):
+        self._remove(product_id)
+        weights = {}
+        for field, text in (("name", name), ("category", category), ("description", description)):
+            for token in tokenize(text):
+                weights[token] = max(weights.get(token, 0.0), FIELD_WEIGHTS[field])
+        for token, weight in weights.items():
+            if token not in self._postings:
+                self._postings[token] = {}
+                self._vocabulary_changed = True
+            self._postings[token][product_id] = weight
+        self._doc_tokens[product_id] = list(weights)
+
+    #Reads from the primary, not the request's session: a lagging replica would leave stale postings behind
+    #for ids that are no longer marked dirty. The session only connects when there is something to load.
+    async def _sync(self):
+        async with AsyncSessionLocal() as db:
+            await self._load(db)
+
+    async def _load(self, db: AsyncSession):
+        columns = (Product.id, Product.name, Product.category, Product.description)
+        if not self._loaded or self._stale():
+            self._dirty_ids.clear() #the full load below covers them; ids marked while it runs stay dirty
+            self._postings, self._doc_tokens = {}, {} #drops products deleted by other workers too
+            self._vocabulary_changed = True
+            result = await db.stream(select(*columns).execution_options(yield_per=1000))
+            async for row in result:
+                self._add(*row)
+            self._loaded = True
+            self._loaded_at = time.monotonic()
+        elif self._dirty_ids:
+            ids = list(self._dirty_ids)
+            self._dirty_ids.clear() #ids marked while the rows are read stay dirty
+            try:
+                rows = await select_by_ids(db, columns, Product.id, ids)
+            except BaseException: #also on cancellation: the next search retries them
+                self._dirty_ids.update(ids)
+                raise
+            found = set()
+            for row in rows:
+                self._add(*row)
+                found.add(row[0])
+            for product_id in set(ids) - found: #deleted products
+                self._remove(product_id)
+        if self._vocabulary_changed:
+            self._sorted_tokens = sorted(self._postings)
+            self._vocabulary_changed = False
+
+    #Scores of the products matching a single query term (exact word or word prefix).
+    def _term_scores(self, term: str) -> dict:
+        scores = {}
+        position = bisect_left(self._sorted_tokens, term)
+        while position < len(self._sorted_tokens) and self._sorted_tokens[position].startswith(term):
+            token = self._sorted_tokens[position]
+            factor = 1.0 if token == term else PREFIX_MATCH_FACTOR
+            for product_id, weight in self._postings[token].items():
+                scores[product_id] = max(scores.get(product_id, 0.0), weight * factor)
+            position += 1
+        return scores
+
+    async def _ranked_ids(self, db: AsyncSession, keyword: str) -> List[int]:
+        terms = tokenize(keyword)
+        if not terms:
+            return []
+        async with self._lock:
+            await self._sync()
+            totals = None
+            for term in terms: #every word must match
+                scores = self._term_scores(term)
+                if totals is None:
+                    totals = scores
+                else:
+                    totals = {pid: totals[pid] + score for pid, score in scores.items() if pid in totals}
+                if not totals:
+                    return []
+        return sorted(totals, key=lambda pid: (-totals[pid], pid))
+
+    #The ids are rendered into the SQL as integer literals (SQLite caps the number of bound variables) and capped at
+    #the SEARCH_CONDITION_MAX_IDS best matches, so a very common keyword does not produce an unbounded statement.
+    #Callers that need every match (keyword facets) use matching_ids instead.
+    async def condition(self, db: AsyncSession, keyword: str):
+        ids = (await self._ranked_ids(db, keyword))[:settings.SEARCH_CONDITION_MAX_IDS]
+        return Product.id.in_(bindparam("search_ids", ids, expanding=True, literal_execute=True, unique=True))
+
+    async def matching_ids(self, db: AsyncSession, keyword: str) -> List[int]:
+        return await self._ranked_ids(db, keyword)
+
+    async def search(self, db: AsyncSession, keyword: str, offset: int, limit: int) -> List[Product]:
+        page_ids = (await self._ranked_ids(db, keyword))[offset:offset + limit]
+        if not page_ids:
+            return []
+        products = {p.id: p for p in (await db.execute(select(Product).where(Product.id.in_(page_ids)))).scalars()}
+        return [products[pid] for pid in page_ids if pid in products]
+
+
+def _build_search_index() -> SearchIndex:
+    backend = settings.SEARCH_BACKEND.lower()
+    if backend == "auto":
+        backend = "postgres" if engine.dialect.name == "postgresql" else "memory"
+    if backend == "postgres":
+        return PostgresSearchIndex()
+    if backend == "memory":
+        return InMemorySearchIndex()
+    raise ValueError(f"Unknown SEARCH_BACKEND: {settings.SEARCH_BACKEND}")
+
+search_index = _build_search_index()
+on_products_changed(search_index.mark_dirty) #keeps the index in sync with this worker's admin writes
@@ -0,0 +1,40 @@
+import base64
+import json
+from fastapi import HTTPException
+
+#Opaque cursors for keyset pagination.
+#A cursor stores the sort key name and the sort values of the last row of a page (e.g. ["price", [499.0, 17]]),
+#and is base64url encoded so clients treat it as an opaque string.
+def encode_cursor(sort_key: str, values: list) -> str:
+    raw = json.dumps([sort_key, values], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+#The last value is always the row id (an integer) and sort values are never null (nullable sort columns are coalesced).
+def _valid_values(values, length: int) -> bool:
+    if not isinstance(values, list) or len(values) != length:
+        return False
+    if not all(isinstance(value, (str, int, float)) and not isinstance(value, bool) for value in values):
+        return False
+    return isinstance(values[-1], int)
+
+#The sort key stored in a cursor, or None when it cannot be decoded (decode_cursor then reports the error).
+def cursor_sort_key(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        stored_key, _ = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        return None
+    return stored_key if isinstance(stored_key, str) else None
+
+#Returns the stored sort values (length of them), or raises a 400 for a malformed cursor.
+def decode_cursor(cursor: str, sort_key: str, length: int) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        stored_key, values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if stored_key != sort_key:
+        raise HTTPException(status_code=400, detail="Cursor does not match the requested sort order")
+    if not _valid_values(values, length):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
@@ -1,31 +1,127 @@
+import queue
 import smtplib #Imports Python's built-in module for sending emails using the SMTP (Simple Mail Transfer Protocol).
+import threading
+import time
+from contextlib import contextmanager
 from email.mime.text import MIMEText # a class to create plain text email messages
-from app.core.logger import logger
-def send_reset_email(to_email, token):
-    # Specifies Gmail’s SMTP server and port.
-    smtp_server = "smtp.gmail.com" 
-    smtp_port = 587
-    from_email = "ecommercebackenddb@gmail.com"
-    from_password = "ijizicedpltgliwk"  
+from app.core.config import settings
+from app.core.logger import get_logger
+
+logger = get_logger("notifications")
+
+#Subject and body of the password reset email.
+def reset_email_content(token: str):
+    reset_link = f"http://localhost:3000/reset-password?token={token}" # includes the token in the query string.
+    subject = "Password Reset"
+    body = f"Click the following link to reset your password: {reset_link}"
+    return subject, body
+
+def build_message(from_email: str, to_email: str, subject: str, body: str) -> MIMEText:
+    message = MIMEText(body, "plain")
+    message["Subject"] = subject
+    message["From"] = from_email
+    message["To"] = to_email
+    return message
+
+#Pool of long-lived SMTP connections: connect, STARTTLS and login happen once per connection, not once per email.
+#Idle connections are checked with NOOP before reuse and dropped after max_idle seconds (servers close them anyway).
+class SMTPConnectionPool:
+    def __init__(self, host: str, port: int, username: str, password: str, use_tls: bool, size: int, max_idle: float):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.max_idle = max_idle
+        self._idle = queue.LifoQueue(maxsize=size) #(connection, last_used)
+        self._slots = threading.BoundedSemaphore(size)
+        self.connections_opened = 0
+
+    def _connect(self) -> smtplib.SMTP:
+        # Connect and Authenticate with SMTP Server
+        server = smtplib.SMTP(self.host, self.port, timeout=30)
+        server.ehlo()
+        if self.use_tls:
+            server.starttls()
+            server.ehlo() #identifies the client to the server
+        if self.password: #local stand-ins (e.g. aiosmtpd) need no login
+            server.login(self.username, self.password)
+        self.connections_opened += 1
+        return server
+
+    def _checkout(self) -> smtplib.SMTP:
+        while True:
+            try:
+                server, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if time.monotonic() - last_used < self.max_idle:
+                try:
+                    if server.noop()[0] == 250:
+                        return server
+                except (smtplib.SMTPException, OSError):
+                    pass
+            self._close(server)
+
+    def _close(self, server: smtplib.SMTP):
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+
+    #Yields a ready connection; it goes back to the pool unless an error escaped (then its state is unknown).
+    @contextmanager
+    def connection(self):
+        with self._slots:
+            server = self._checkout()
+            try:
+                yield server
+            except BaseException:
+                server.close()
+                raise
+            self._return(server)
+
+    def _return(self, server: smtplib.SMTP):
+        if server.sock is None: #closed by the server
+            return
+        try:
+            self._idle.put_nowait((server, time.monotonic()))
+        except queue.Full:
+            self._close(server)
+
+    def close_all(self):
+        while True:
+            try:
+                server, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close(server)
+
+smtp_pool = SMTPConnectionPool(
+    host=settings.EMAIL_HOST,
+    port=settings.EMAIL_PORT,
+    username=settings.EMAIL_USER,
+    password=settings.EMAIL_PASS,
+    use_tls=settings.EMAIL_USE_TLS,
+    size=settings.EMAIL_SMTP_POOL_SIZE,
+    max_idle=settings.EMAIL_SMTP_MAX_IDLE_SECONDS,
+)
+
+#Sends several messages over one pooled connection (called from a worker thread).
+#Returns {message id: error text or None}; a broken connection fails the rest of the batch so it is retried later.
+def send_batch(messages) -> dict:
+    results = {}
     try:
-       # Connect and Authenticate with SMTP Server
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.ehlo()  
-        server.starttls()
-        server.ehlo()  #identifies the client to the server 
-        server.login(from_email, from_password)
-
-        reset_link = f"http://localhost:3000/reset-password?token={token}" # includes the token in the query string.
-        subject = "Password Reset"
-        body = f"Click the following link to reset your password: {reset_link}"
-        message = MIMEText(body, "plain")
-        message["Subject"] = subject
-        message["From"] = from_email
-        message["To"] = to_email
-
-        server.sendmail(from_email, to_email, message.as_string())
-        server.quit()
-        logger.info("Reset email sent successfully.")
-    except Exception as e:
-        logger.exception("Failed to send email") 
-        raise
+        with smtp_pool.connection() as server:
+            for message_id, to_email, subject, body in messages:
+                try:
+                    message = build_message(settings.EMAIL_USER, to_email, subject, body)
+                    server.sendmail(settings.EMAIL_USER, to_email, message.as_string())
+                    results[message_id] = None
+                except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError, smtplib.SMTPSenderRefused) as e:
+                    results[message_id] = str(e) #this message only; the connection is still usable
+    except (smtplib.SMTPException, OSError) as e:
+        logger.exception("SMTP connection failed while sending a batch")
+        for message_id, *_ in messages:
+            results.setdefault(message_id, str(e))
+    return results
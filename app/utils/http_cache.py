@@ -0,0 +1,56 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Iterable, Optional, Tuple
+from fastapi import Request, Response
+from app.core.config import settings
+
+#Conditional GET for the public product endpoints. ETags are strong and derived from product versions
+#(Product.version is bumped by every write), so a revalidation never needs the response body:
+#a single product is checked with a primary-key lookup of its version, a list by the (id, version) pairs of its page.
+
+def product_etag(product_id: int, version: int) -> str:
+    return f'"p{product_id}-v{version}"'
+
+#ETag of a page of products: a digest of the (id, version) pairs in page order, plus anything else that shapes
+#the response (e.g. whether a next page exists).
+def list_etag(pairs: Iterable[Tuple[int, int]], *extra) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for product_id, version in pairs:
+        digest.update(f"{product_id}:{version},".encode())
+    digest.update(repr(extra).encode())
+    return f'"l{digest.hexdigest()}"'
+
+def _utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value #SQLite returns naive UTC values
+
+def is_conditional(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+#True when the client's copy is current. If-None-Match wins over If-Modified-Since (RFC 9110 13.2.2);
+#ETags are compared weakly, as If-None-Match requires.
+def not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return _utc(last_modified).replace(microsecond=0) <= _utc(since) #HTTP dates have whole seconds
+    return False
+
+def cache_headers(etag: str, last_modified: Optional[datetime] = None) -> dict:
+    headers = {"ETag": etag, "Cache-Control": settings.PRODUCT_CACHE_CONTROL}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(_utc(last_modified), usegmt=True)
+    return headers
+
+def set_cache_headers(response: Response, etag: str, last_modified: Optional[datetime] = None):
+    response.headers.update(cache_headers(etag, last_modified))
+
+def not_modified_response(etag: str, last_modified: Optional[datetime] = None) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag, last_modified))
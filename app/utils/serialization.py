@@ -0,0 +1,72 @@
+import json
+from datetime import datetime
+from typing import Any, Optional
+from fastapi import Response
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError: #optional dependency: without orjson the fast path encodes with the json module
+    orjson = None
+
+#Serialization fast path for hot read routes. A route that builds its rows already shaped like its response_model
+#returns them through json_response(): FastAPI skips validating the rows against the model (it only does that for
+#return values that are not a Response), and the body is encoded once, by orjson when installed.
+#The shapers below produce exactly the fields of their schema (ProductOut, OrderSummaryOut, CartItemOut), so the
+#declared response_model still documents the body. Keep them in step with app/*/schemas.py.
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat().replace("+00:00", "Z") #same text as Pydantic and orjson with OPT_UTC_Z
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+        return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+#Response for pre-shaped content. Headers set on the route's injected Response (cursors, ETags) are copied over,
+#since FastAPI drops them when a route returns its own Response.
+def json_response(content: Any, response: Optional[Response] = None, status_code: int = 200) -> FastJSONResponse:
+    result = FastJSONResponse(content, status_code=status_code)
+    if response is not None:
+        for name, value in response.headers.items():
+            if name != "content-length":
+                result.headers[name] = value
+    return result
+
+#ProductOut fields of an ORM Product.
+def product_out(product) -> dict:
+    return {
+        "name": product.name,
+        "description": product.description,
+        "price": product.price,
+        "stock": product.stock,
+        "category": product.category,
+        "image_url": product.image_url,
+        "sku": product.sku,
+        "id": product.id,
+        "available": product.available,
+    }
+
+PRODUCT_OUT_FIELDS = ("name", "description", "price", "stock", "category", "image_url", "sku", "id", "available")
+
+#ProductOut fields of a catalog snapshot row (app/products/catalog.py), which also carries version and updated_at.
+def product_row_out(row: dict) -> dict:
+    return {field: row[field] for field in PRODUCT_OUT_FIELDS}
+
+#OrderSummaryOut fields of an order history row (a mapping of id, total_price, status, created_at).
+def order_summary_out(row) -> dict:
+    return {"id": row["id"], "total_price": row["total_price"], "status": row["status"], "created_at": row["created_at"]}
+
+#CartItemOut fields of an ORM CartItem with its product loaded.
+def cart_item_out(item) -> dict:
+    product = item.product
+    return {
+        "id": item.id,
+        "user_id": item.user_id,
+        "product_id": item.product_id,
+        "quantity": item.quantity,
+        "product": {"id": product.id, "name": product.name, "price": product.price},
+    }
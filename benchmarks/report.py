@@ -0,0 +1,80 @@
+import argparse
+import json
+import sys
+from typing import List, Optional
+
+#Summaries, JSON result files and run-to-run comparison for the benchmark harness.
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values) + 0.5) - 1)) #nearest rank
+    return sorted_values[index]
+
+def summarize(latencies: List[float], statuses: dict, errors: int, elapsed: float) -> dict:
+    values = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 3)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+        "throughput_rps": round(len(values) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": ms(percentile(values, 0.50)),
+            "p95": ms(percentile(values, 0.95)),
+            "p99": ms(percentile(values, 0.99)),
+            "mean": ms(sum(values) / len(values)) if values else 0.0,
+            "max": ms(values[-1]) if values else 0.0,
+        },
+    }
+
+def save(results: dict, path: str):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+def print_results(results: dict):
+    print(f"{'scenario':<22}{'requests':>9}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, data in results["scenarios"].items():
+        latency = data["latency_ms"]
+        print(f"{name:<22}{data['requests']:>9}{data['errors']:>8}{data['throughput_rps']:>10}{latency['p50']:>10}{latency['p95']:>10}{latency['p99']:>10}")
+
+def _change(old: float, new: float) -> Optional[float]:
+    return round((new - old) / old * 100, 1) if old else None
+
+#Prints the p50/p95/p99 and throughput change per scenario and returns the scenarios whose p95
+#got slower by more than max_regression_pct (a negative change in throughput is reported, not enforced).
+def compare(baseline: dict, current: dict, max_regression_pct: Optional[float] = None) -> list:
+    print(f"baseline: {baseline['meta'].get('commit')}  current: {current['meta'].get('commit')}")
+    print(f"{'scenario':<22}{'p50 %':>9}{'p95 %':>9}{'p99 %':>9}{'rps %':>9}")
+    regressions = []
+    for name, data in current["scenarios"].items():
+        old = baseline["scenarios"].get(name)
+        if old is None:
+            print(f"{name:<22}{'(new)':>9}")
+            continue
+        changes = [_change(old["latency_ms"][key], data["latency_ms"][key]) for key in ("p50", "p95", "p99")]
+        changes.append(_change(old["throughput_rps"], data["throughput_rps"]))
+        print(f"{name:<22}" + "".join(f"{'n/a' if c is None else f'{c:+.1f}':>9}" for c in changes))
+        if max_regression_pct is not None and changes[1] is not None and changes[1] > max_regression_pct:
+            regressions.append(name)
+    return regressions
+
+#python -m benchmarks.report baseline.json current.json [--max-regression-pct 10]
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--max-regression-pct", type=float, default=None, help="exit with status 1 if a p95 got slower by more than this")
+    args = parser.parse_args(argv)
+    regressions = compare(load(args.baseline), load(args.current), args.max_regression_pct)
+    if regressions:
+        print(f"p95 regressions: {', '.join(regressions)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Iterable
+import httpx
+from benchmarks.report import summarize
+from benchmarks.seed import CATEGORIES, ADJECTIVES, NOUNS, HOT_PRODUCT_ID
+
+#Scripted shopping flows driven through the real FastAPI app (routing, validation, auth and database included).
+
+SORT_KEYS = ["id", "name", "price", "stock"]
+
+#Runs make_request(i) for i in range(requests) on `concurrency` workers and summarizes the latencies.
+#Responses outside `expected` count as errors.
+async def run_requests(requests: int, concurrency: int, make_request: Callable[[int], Awaitable[httpx.Response]], expected: Iterable[int]) -> dict:
+    expected = set(expected)
+    latencies, statuses = [], {}
+    errors = 0
+    next_index = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in next_index: #shared iterator: each index is taken by exactly one worker
+            started = time.perf_counter()
+            try:
+                response = await make_request(i)
+                status = response.status_code
+            except Exception:
+                status = 599
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+            if status not in expected:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, statuses, errors, time.perf_counter() - started)
+
+
+class Scenarios:
+    def __init__(self, client: httpx.AsyncClient, tokens: dict, products: int, seed_value: int = 7):
+        self.client = client
+        self.tokens = tokens #shopper id -> bearer token
+        self.shoppers = sorted(tokens)
+        self.products = products
+        self.rng = random.Random(seed_value)
+
+    def _auth(self, user_id: int) -> dict:
+        return {"Authorization": f"Bearer {self.tokens[user_id]}"}
+
+    def _shopper(self, i: int) -> int:
+        return self.shoppers[i % len(self.shoppers)]
+
+    #Anonymous catalog browsing: category filter, sorting and deep-ish pages.
+    async def browse(self, requests: int, concurrency: int) -> dict:
+        async def request(i):
+            params = {"category": self.rng.choice(CATEGORIES), "sort_by": self.rng.choice(SORT_KEYS), "page": self.rng.randint(1, 20), "page_size": 20}
+            return await self.client.get("/products", params=params)
+        return await run_requests(requests, concurrency, request, {200})
+
+    #Anonymous keyword search with one or two words (some of them prefixes).
+    async def search(self, requests: int, concurrency: int) -> dict:
+        async def request(i):
+            words = [self.rng.choice(NOUNS)] if i % 2 else [self.rng.choice(ADJECTIVES), self.rng.choice(NOUNS)[:4]]
+            return await self.client.get("/products/search", params={"keyword": " ".join(words), "page_size": 20})
+        return await run_requests(requests, concurrency, request, {200})
+
+    async def add_to_cart(self, requests: int, concurrency: int) -> dict:
+        async def request(i):
+            body = {"product_id": self.rng.randint(HOT_PRODUCT_ID + 1, self.products), "quantity": 1}
+            return await self.client.post("/cart/", json=body, headers=self._auth(self._shopper(i)))
+        return await run_requests(requests, concurrency, request, {201})
+
+    async def order_history(self, requests: int, concurrency: int) -> dict:
+        async def request(i):
+            return await self.client.get("/orders/", headers=self._auth(self._shopper(i)))
+        return await run_requests(requests, concurrency, request, {200})
+
+    #Every participating shopper puts the hot product (limited stock) in the cart, then all check out at once.
+    #Only the checkout requests are timed; 400 "not enough stock" is an expected outcome once the stock runs out.
+    async def checkout_contention(self, requests: int, concurrency: int) -> dict:
+        buyers = self.shoppers[:requests]
+        for user_id in buyers:
+            await self.client.post("/cart/", json={"product_id": HOT_PRODUCT_ID, "quantity": 1}, headers=self._auth(user_id))
+
+        async def request(i):
+            return await self.client.post("/checkout/", json={"status": "paid"}, headers=self._auth(buyers[i]))
+        return await run_requests(len(buyers), concurrency, request, {201, 400})
+
+    #Scenarios in run order (the mutating ones last, so they do not change what the read scenarios see).
+    def all(self) -> dict:
+        return {
+            "browse": self.browse,
+            "search": self.search,
+            "order_history": self.order_history,
+            "add_to_cart": self.add_to_cart,
+            "checkout_contention": self.checkout_contention,
+        }
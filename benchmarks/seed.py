@@ -0,0 +1,102 @@
+import random
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import insert, update, case
+from app.core.database import engine, Base, init_db
+from app.auth.models import User
+from app.auth.utils import pwd_context
+from app.products.models import Product
+from app.cart.models import CartItem, StockReservation
+from app.orders.models import Order, OrderItem
+
+#Deterministic benchmark dataset: users with order history and a filled cart, and a large catalog.
+#Product 1 is the "hot" product with limited stock that all users compete for in the checkout scenario.
+
+PASSWORD = "benchmark-password"
+HOT_PRODUCT_ID = 1
+CHUNK_SIZE = 1000
+
+CATEGORIES = [
+    "electronics", "books", "clothing", "shoes", "toys", "garden", "kitchen", "sports", "beauty", "music",
+    "office", "automotive", "pets", "grocery", "health", "furniture", "tools", "games", "baby", "outdoor",
+]
+ADJECTIVES = ["blue", "red", "compact", "wireless", "organic", "classic", "premium", "portable", "smart", "vintage", "large", "mini"]
+NOUNS = ["laptop", "phone", "lamp", "chair", "backpack", "kettle", "novel", "jacket", "sneaker", "speaker", "watch", "blender", "puzzle", "guitar"]
+
+def _insert(conn, model, rows):
+    for start in range(0, len(rows), CHUNK_SIZE):
+        conn.execute(insert(model), rows[start:start + CHUNK_SIZE])
+
+def _products(rng: random.Random, count: int, hot_stock: int) -> list:
+    rows = []
+    for product_id in range(1, count + 1):
+        name = f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {product_id}"
+        rows.append({
+            "id": product_id,
+            "name": name,
+            "description": " ".join(rng.choice(ADJECTIVES + NOUNS) for _ in range(12)),
+            "price": round(rng.uniform(1, 2000), 2),
+            "stock": hot_stock if product_id == HOT_PRODUCT_ID else rng.randint(1000, 100000),
+            "category": rng.choice(CATEGORIES),
+            "image_url": f"https://example.com/images/{product_id}.jpg",
+            "reserved": 0,
+        })
+    return rows
+
+#Drops and recreates all tables, then inserts the dataset. Returns the ids of the seeded shoppers.
+def seed(users: int, products: int, orders_per_user: int, cart_items: int, hot_stock: int, seed_value: int = 42) -> list:
+    rng = random.Random(seed_value)
+    Base.metadata.drop_all(bind=engine)
+    init_db()
+
+    password_hash = pwd_context.hash(PASSWORD) #one bcrypt hash shared by all users keeps seeding fast
+    user_rows = [{"id": 1, "name": "Bench Admin", "email": "admin@bench.com", "password": password_hash, "role": "admin"}]
+    user_rows += [
+        {"id": user_id, "name": f"Shopper {user_id}", "email": f"shopper{user_id}@bench.com", "password": password_hash, "role": "user"}
+        for user_id in range(2, users + 2)
+    ]
+    shopper_ids = [row["id"] for row in user_rows[1:]]
+    product_rows = _products(rng, products, hot_stock)
+    prices = {row["id"]: row["price"] for row in product_rows}
+
+    now = datetime.now(timezone.utc)
+    order_rows, item_rows = [], []
+    order_id = 0
+    for user_id in shopper_ids:
+        for _ in range(orders_per_user):
+            order_id += 1
+            lines = [(rng.randint(2, products), rng.randint(1, 3)) for _ in range(rng.randint(1, 4))]
+            for product_id, quantity in lines:
+                item_rows.append({"order_id": order_id, "product_id": product_id, "quantity": quantity, "price_per_unit": prices[product_id]})
+            order_rows.append({
+                "id": order_id,
+                "user_id": user_id,
+                "total_price": round(sum(prices[p] * q for p, q in lines), 2),
+                "status": rng.choice(["paid", "pending", "cancelled"]),
+                "created_at": now - timedelta(minutes=rng.randint(1, 365 * 24 * 60)),
+            })
+
+    #Carts hold stock like real add-to-cart calls do: one reservation per line, mirrored in Product.reserved.
+    cart_rows, reservation_rows, reserved = [], [], {}
+    for user_id in shopper_ids:
+        for product_id in rng.sample(range(2, products + 1), min(cart_items, products - 1)):
+            quantity = rng.randint(1, 2)
+            cart_rows.append({"user_id": user_id, "product_id": product_id, "quantity": quantity})
+            reservation_rows.append({"user_id": user_id, "product_id": product_id, "quantity": quantity, "expires_at": now + timedelta(days=1)})
+            reserved[product_id] = reserved.get(product_id, 0) + quantity
+
+    with engine.begin() as conn:
+        _insert(conn, User, user_rows)
+        _insert(conn, Product, product_rows)
+        _insert(conn, Order, order_rows)
+        _insert(conn, OrderItem, item_rows)
+        _insert(conn, CartItem, cart_rows)
+        _insert(conn, StockReservation, reservation_rows)
+        ids = list(reserved)
+        for start in range(0, len(ids), CHUNK_SIZE):
+            chunk = {product_id: reserved[product_id] for product_id in ids[start:start + CHUNK_SIZE]}
+            conn.execute(update(Product).where(Product.id.in_(chunk)).values(reserved=case(chunk, value=Product.id)))
+        if conn.dialect.name == "postgresql": #explicit ids were inserted, move the sequences past them
+            for table in ("users", "products", "orders"):
+                conn.exec_driver_sql(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))")
+            conn.exec_driver_sql("ANALYZE")
+    return shopper_ids
@@ -0,0 +1,91 @@
+import argparse
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from app.products.schemas import ProductOut
+from app.orders.schemas import OrderSummaryOut
+from app.utils import serialization
+from app.utils.serialization import FastJSONResponse, product_out, order_summary_out
+from benchmarks import report
+
+#CPU cost of turning one page of rows into a response body, per strategy (no database, no HTTP):
+#
+#   python -m benchmarks.serialization --page-size 100 --iterations 2000
+#
+#   validate+dump_json   response_model validation, then Pydantic's own JSON encoder (FastAPI's default path)
+#   validate+json        response_model validation, jsonable_encoder and the json module (older FastAPI releases)
+#   validate+orjson      response_model validation, then orjson (what an app-wide orjson default_response_class costs)
+#   shaped+orjson        rows shaped by app/utils/serialization.py, encoded once (json_response)
+
+class _Product: #stands in for an ORM Product: plain attributes plus the available property
+    def __init__(self, i: int):
+        self.id = i
+        self.name = f"Product {i} with a reasonably long display name"
+        self.description = "A description long enough to look like a real catalog entry. " * 3
+        self.price = 10.0 + i * 0.25
+        self.stock = i % 50
+        self.reserved = i % 3
+        self.category = ("books", "electronics", "home", "toys")[i % 4]
+        self.image_url = f"https://cdn.example.com/products/{i}.jpg"
+        self.sku = f"SKU-{i:06d}"
+
+    @property
+    def available(self) -> int:
+        return max(self.stock - self.reserved, 0)
+
+def _orders(count: int) -> List[dict]:
+    now = datetime.now(timezone.utc)
+    return [{"id": i, "total_price": 99.5 + i, "status": "paid", "created_at": now - timedelta(hours=i)} for i in range(count)]
+
+def _strategies(schema, rows, shaper):
+    adapter = TypeAdapter(List[schema])
+    validate = lambda: adapter.validate_python(rows, from_attributes=True)
+    strategies = {
+        "validate+dump_json": lambda: adapter.dump_json(validate()),
+        "validate+json": lambda: JSONResponse(jsonable_encoder(validate())).body,
+    }
+    if serialization.orjson is not None:
+        orjson = serialization.orjson
+        strategies["validate+orjson"] = lambda: orjson.dumps(adapter.dump_python(validate(), mode="json"), option=orjson.OPT_NON_STR_KEYS)
+    strategies["shaped+orjson" if serialization.orjson is not None else "shaped+json"] = lambda: FastJSONResponse([shaper(row) for row in rows]).body
+    return strategies
+
+#CPU microseconds per response for each strategy (process time, so waiting does not count).
+def measure(strategies: dict, iterations: int) -> dict:
+    results = {}
+    for name, render in strategies.items():
+        for _ in range(max(iterations // 10, 1)): #warm-up
+            render()
+        started = time.process_time()
+        for _ in range(iterations):
+            render()
+        results[name] = round((time.process_time() - started) / iterations * 1e6, 1)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure response serialization CPU per request.")
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    pages = {
+        "products": _strategies(ProductOut, [_Product(i) for i in range(args.page_size)], product_out),
+        "order_history": _strategies(OrderSummaryOut, _orders(args.page_size), order_summary_out),
+    }
+    results = {"page_size": args.page_size, "iterations": args.iterations, "cpu_us_per_response": {}}
+    for page, strategies in pages.items():
+        timings = measure(strategies, args.iterations)
+        results["cpu_us_per_response"][page] = timings
+        baseline = timings["validate+dump_json"]
+        print(f"{page} ({args.page_size} rows per response)")
+        for name, micros in timings.items():
+            print(f"  {name:<20}{micros:>10.1f} us{(micros - baseline) / baseline * 100:>+9.1f} %")
+    if args.output:
+        report.save(results, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import itertools
+import os
+import tempfile
+
+#Settings are read when app.core.config is imported, so the test environment is set up before importing the app:
+#a throwaway SQLite database, cheap password hashing and no background sweeper (tests run it explicitly).
+_workdir = tempfile.mkdtemp(prefix="ecommerce-tests-")
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{os.path.join(_workdir, 'test.db')}",
+    DATABASE_REPLICA_URLS="",
+    SECRET_KEY="test-secret",
+    ALGORITHM="HS256",
+    ACCESS_TOKEN_EXPIRE_MINUTES="60",
+    EMAIL_USER="shop@example.com",
+    EMAIL_PASS="",
+    EMAIL_HOST="localhost",
+    EMAIL_PORT="1",
+    EMAIL_USE_TLS="false",
+    PASSWORD_RESET_SECRET="test-reset-secret",
+    BCRYPT_ROUNDS="4",
+    LOG_FILE=os.path.join(_workdir, "app.log"),
+    LOG_LEVEL="ERROR",
+    CATALOG_SNAPSHOT_ENABLED="false",
+    RESERVATION_SWEEP_INTERVAL_SECONDS="0",
+)
+
+import httpx
+import pytest
+from sqlalchemy import select
+from app.main import app
+from app.core.database import SessionLocal
+from app.products.models import Product
+
+_emails = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    return "asyncio"
+
+#One application for the whole run (startup creates the tables). Tests keep apart by creating their own users
+#and products instead of sharing rows.
+@pytest.fixture(scope="session")
+async def client(anyio_backend):
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http_client:
+            yield http_client
+
+async def _signup(client, role: str) -> dict:
+    email = f"{role}{next(_emails)}@example.com"
+    response = await client.post("/auth/signup", json={"name": role, "email": email, "password": "pw", "role": role})
+    assert response.status_code == 201, response.text
+    response = await client.post("/auth/signin", json={"email": email, "password": "pw"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+@pytest.fixture
+async def admin(client):
+    return await _signup(client, "admin")
+
+#Returns a factory: every call signs up a new shopper and returns its auth headers.
+@pytest.fixture
+async def new_user(client):
+    return lambda: _signup(client, "user")
+
+#Returns a factory that creates a product with the given stock and returns its id.
+@pytest.fixture
+def new_product(client, admin):
+    async def create(stock: int, price: float = 10.0) -> int:
+        response = await client.post("/admin/products", headers=admin, json={
+            "name": "test product", "description": "d", "price": price, "stock": stock, "category": "tests", "image_url": "u",
+        })
+        assert response.status_code == 201, response.text
+        return response.json()["id"]
+    return create
+
+#Returns a function giving (stock, reserved) of a product, read straight from the database.
+@pytest.fixture
+def stock_of():
+    def read(product_id: int) -> tuple:
+        with SessionLocal() as db:
+            row = db.execute(select(Product.stock, Product.reserved).where(Product.id == product_id)).one()
+            return row.stock, row.reserved
+    return read
@@ -0,0 +1,149 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import pytest
+from sqlalchemy import delete, update
+from app.cart.models import CartItem, StockReservation
+from app.cart.reservations import release_expired_reservations
+from app.core.config import settings
+from app.core.database import SessionLocal
+
+pytestmark = pytest.mark.anyio
+
+
+def _expire_holds(product_id: int):
+    with SessionLocal() as db:
+        db.execute(update(StockReservation).where(StockReservation.product_id == product_id)
+                   .values(expires_at=datetime.now(timezone.utc) - timedelta(seconds=1)))
+        db.commit()
+
+
+async def test_add_to_cart_holds_stock(client, new_user, new_product, stock_of):
+    product_id = await new_product(stock=5)
+    user = await new_user()
+    assert (await client.post("/cart/", headers=user, json={"product_id": product_id, "quantity": 2})).status_code == 201
+    assert (await client.post("/cart/", headers=user, json={"product_id": product_id, "quantity": 1})).status_code == 201
+    assert stock_of(product_id) == (5, 3)
+    product = (await client.get(f"/products/{product_id}")).json()
+    assert product["available"] == 2
+
+
+async def test_cached_product_follows_the_hold(client, new_user, new_product):
+    product_id = await new_product(stock=5)
+    user = await new_user()
+    before = await client.get(f"/products/{product_id}") #now cached
+    await client.post("/cart/", headers=user, json={"product_id": product_id, "quantity": 2})
+    after = await client.get(f"/products/{product_id}", headers={"If-None-Match": before.headers["ETag"]})
+    assert after.status_code == 200
+    assert after.json()["available"] == 3
+    assert after.headers["ETag"] != before.headers["ETag"]
+
+
+async def test_concurrent_first_adds_of_a_product_merge(client, new_user, new_product, stock_of):
+    product_id = await new_product(stock=5)
+    user = await new_user()
+    responses = await asyncio.gather(*(
+        client.post("/cart/", headers=user, json={"product_id": product_id, "quantity": 1}) for _ in range(3)
+    ))
+    assert [response.status_code for response in responses] == [201, 201, 201]
+    assert [(item["product_id"], item["quantity"]) for item in (await client.get("/cart/", headers=user)).json()] == [(product_id, 3)]
+    assert stock_of(product_id) == (5, 3)
+
+
+async def test_add_to_cart_rejects_more_than_available(client, new_user, new_product, stock_of):
+    product_id = await new_product(stock=2)
+    user = await new_user()
+    response = await client.post("/cart/", headers=user, json={"product_id": product_id, "quantity": 3})
+    assert response.status_code == 400
+    assert stock_of(product_id) == (2, 0)
+
+
+async def test_add_to_cart_unknown_product(client, new_user):
+    user = await new_user()
+    response = await client.post("/cart/", headers=user, json={"product_id": 10**9, "quantity": 1})
+    assert response.status_code == 404
+
+
+async def test_lowering_and_removing_release_the_hold(client, new_user, new_product, stock_of):
+    product_id = await new_product(stock=5)
+    user = await new_user()
+    await client.post("/cart/", headers=user, json={"product_id": product_id, "quantity": 4})
+    assert (await client.put(f"/cart/{product_id}", headers=user, json={"quantity": 1})).status_code == 200
+    assert stock_of(product_id) == (5, 1)
+    assert (await client.delete(f"/cart/{product_id}", headers=user)).status_code == 204
+    assert stock_of(product_id) == (5, 0)
+
+
+async def test_expired_holds_are_released(client, new_user, new_product, stock_of):
+    product_id = await new_product(stock=5)
+    user = await new_user()
+    await client.post("/cart/", headers=user, json={"product_id": product_id, "quantity": 2})
+    _expire_holds(product_id)
+    await release_expired_reservations()
+    assert stock_of(product_id) == (5, 0)
+    #the cart line is still there: adding again takes a fresh hold for the whole quantity
+    assert (await client.post("/cart/", headers=user, json={"product_id": product_id, "quantity": 1})).status_code == 201
+    assert stock_of(product_id) == (5, 3)
+
+
+async def test_checkout_releases_holds_without_a_cart_line(client, new_user, new_product, stock_of):
+    bought, orphaned = await new_product(stock=5), await new_product(stock=5)
+    user = await new_user()
+    await client.post("/cart/", headers=user, json={"product_id": bought, "quantity": 1})
+    await client.post("/cart/", headers=user, json={"product_id": orphaned, "quantity": 3})
+    with SessionLocal() as db: #a hold whose cart line is gone
+        db.execute(delete(CartItem).where(CartItem.product_id == orphaned))
+        db.commit()
+    assert (await client.post("/checkout/", headers=user, json={"status": "paid"})).status_code == 201
+    assert stock_of(bought) == (4, 0)
+    assert stock_of(orphaned) == (5, 0)
+
+
+async def test_batch_applies_lines_independently(client, new_user, new_product, stock_of):
+    plenty, scarce = await new_product(stock=10), await new_product(stock=1)
+    user = await new_user()
+    response = await client.post("/cart/batch", headers=user, json={"items": [
+        {"product_id": plenty, "quantity": 2},
+        {"product_id": scarce, "quantity": 2},
+        {"product_id": 10**9, "quantity": 1},
+        {"product_id": plenty, "quantity": 1},
+        {"product_id": scarce, "quantity": 0},
+    ]})
+    assert response.status_code == 200
+    results = response.json()
+    assert [result["ok"] for result in results] == [True, False, False, False, False]
+    assert results[0]["quantity"] == 2
+    assert results[1]["error"] == "Cannot add 2 items to cart. Only 1 left in stock."
+    assert results[2]["error"] == "Product not found"
+    assert results[3]["error"] == "Duplicate product_id in request"
+    assert results[4]["error"] == "Quantity must be greater than zero"
+    assert stock_of(plenty) == (10, 2)
+    assert stock_of(scarce) == (1, 0)
+
+
+async def test_batch_set_mode_lowers_holds(client, new_user, new_product, stock_of):
+    product_id = await new_product(stock=5)
+    user = await new_user()
+    await client.post("/cart/", headers=user, json={"product_id": product_id, "quantity": 4})
+    response = await client.post("/cart/batch", headers=user, json={"mode": "set", "items": [{"product_id": product_id, "quantity": 1}]})
+    assert response.json()[0]["ok"] is True
+    assert stock_of(product_id) == (5, 1)
+
+
+async def test_batch_set_mode_lowers_a_hold_after_stock_was_cut(client, admin, new_user, new_product, stock_of):
+    product_id = await new_product(stock=5)
+    user = await new_user()
+    await client.post("/cart/", headers=user, json={"product_id": product_id, "quantity": 4})
+    await client.put(f"/admin/products/{product_id}", headers=admin, json={
+        "name": "test product", "description": "d", "price": 10.0, "stock": 2, "category": "tests", "image_url": "u",
+    })
+    response = await client.post("/cart/batch", headers=user, json={"mode": "set", "items": [{"product_id": product_id, "quantity": 3}]})
+    assert response.json()[0]["ok"] is True
+    assert stock_of(product_id) == (2, 3)
+
+
+async def test_batch_rejects_empty_and_oversized_requests(client, new_user, new_product):
+    product_id = await new_product(stock=5)
+    user = await new_user()
+    assert (await client.post("/cart/batch", headers=user, json={"items": []})).status_code == 400
+    items = [{"product_id": product_id, "quantity": 1}] * (settings.CART_BATCH_MAX_ITEMS + 1)
+    assert (await client.post("/cart/batch", headers=user, json={"items": items})).status_code == 400
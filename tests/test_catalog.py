@@ -0,0 +1,63 @@
+import pytest
+from app.products import catalog as catalog_module
+from app.products.catalog import CatalogSnapshot
+
+pytestmark = pytest.mark.anyio
+
+
+#A snapshot of its own (the app's is switched off in the tests), fed by hand instead of by the product events.
+@pytest.fixture
+async def snapshot(client):
+    catalog = CatalogSnapshot()
+    await catalog.refresh()
+    return catalog
+
+def _row(catalog, product_id: int) -> dict:
+    rows, _, _ = catalog.query(None, None, None, "id", 0, 1, after=[product_id - 1])
+    return rows[0]
+
+
+async def test_holds_patch_the_snapshot_in_place(client, snapshot, new_user, new_product):
+    product_id = await new_product(stock=5)
+    snapshot.mark_dirty([product_id])
+    await snapshot.refresh()
+    current = snapshot._snapshot
+    user = await new_user()
+    await client.post("/cart/", headers=user, json={"product_id": product_id, "quantity": 2})
+    snapshot.mark_stock_dirty([product_id])
+    await snapshot.refresh()
+    assert snapshot._snapshot is current #no new copy of the columns
+    assert (_row(snapshot, product_id)["stock"], _row(snapshot, product_id)["available"]) == (5, 3)
+
+
+async def test_checkouts_reorder_by_stock(client, snapshot, new_user, new_product):
+    first, second = await new_product(stock=10**6 + 2), await new_product(stock=10**6 + 1)
+    snapshot.mark_dirty([first, second])
+    await snapshot.refresh()
+    user = await new_user()
+    await client.post("/cart/", headers=user, json={"product_id": first, "quantity": 2})
+    await client.post("/checkout/", headers=user, json={"status": "paid"})
+    snapshot.mark_stock_dirty([first])
+    await snapshot.refresh()
+    rows, _, _ = snapshot.query(None, None, None, "stock", 0, 2, after=[10**6 - 1, 0])
+    assert [(row["id"], row["stock"]) for row in rows] == [(first, 10**6), (second, 10**6 + 1)]
+
+
+async def test_refresh_of_many_dirty_ids(client, snapshot, new_product):
+    product_id = await new_product(stock=5)
+    snapshot.mark_dirty([product_id, *range(10**9, 10**9 + 40000)]) #more ids than a statement may bind
+    await snapshot.refresh()
+    assert _row(snapshot, product_id)["id"] == product_id
+
+
+async def test_failed_refresh_keeps_the_ids_dirty(client, snapshot, new_product, monkeypatch):
+    product_id = await new_product(stock=5)
+    snapshot.mark_dirty([product_id])
+    async def lost_connection(*args):
+        raise OSError("connection lost")
+    monkeypatch.setattr(catalog_module, "select_by_ids", lost_connection)
+    with pytest.raises(OSError):
+        await snapshot.refresh()
+    monkeypatch.undo()
+    await snapshot.refresh()
+    assert _row(snapshot, product_id)["id"] == product_id
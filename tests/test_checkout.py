@@ -0,0 +1,134 @@
+import asyncio
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+CHECKOUT = {"status": "paid"}
+
+
+async def test_checkout_orders_every_cart_line(client, new_user, new_product, stock_of):
+    first, second = await new_product(stock=5, price=10.0), await new_product(stock=5, price=2.5)
+    user = await new_user()
+    await client.post("/cart/", headers=user, json={"product_id": first, "quantity": 2})
+    await client.post("/cart/", headers=user, json={"product_id": second, "quantity": 4})
+    response = await client.post("/checkout/", headers=user, json=CHECKOUT)
+    assert response.status_code == 201
+    assert (stock_of(first), stock_of(second)) == ((3, 0), (1, 0))
+    order = (await client.get(f"/orders/{response.json()['order_id']}", headers=user)).json()
+    assert order["total_price"] == 30.0
+    assert sorted((item["product_id"], item["quantity"]) for item in order["items"]) == [(first, 2), (second, 4)]
+    assert (await client.get("/cart/", headers=user)).json() == []
+
+
+async def test_concurrent_holds_never_oversell(client, new_user, new_product, stock_of):
+    product_id = await new_product(stock=3)
+    users = [await new_user() for _ in range(5)]
+    responses = await asyncio.gather(*(
+        client.post("/cart/", headers=user, json={"product_id": product_id, "quantity": 1}) for user in users
+    ))
+    assert sorted(response.status_code for response in responses) == [201, 201, 201, 400, 400]
+    assert stock_of(product_id) == (3, 3)
+
+
+async def test_checkout_converts_the_hold(client, new_user, new_product, stock_of):
+    product_id = await new_product(stock=5)
+    user = await new_user()
+    await client.post("/cart/", headers=user, json={"product_id": product_id, "quantity": 2})
+    assert stock_of(product_id) == (5, 2)
+    response = await client.post("/checkout/", headers=user, json=CHECKOUT)
+    assert response.status_code == 201
+    assert stock_of(product_id) == (3, 0)
+
+
+async def test_checkout_of_an_empty_cart_is_rejected(client, new_user):
+    user = await new_user()
+    response = await client.post("/checkout/", headers=user, json=CHECKOUT)
+    assert response.status_code == 400
+
+
+async def test_checkout_rolls_back_when_stock_was_cut_below_the_cart(client, admin, new_user, new_product, stock_of):
+    plenty, cut = await new_product(stock=5), await new_product(stock=2)
+    user = await new_user()
+    await client.post("/cart/", headers=user, json={"product_id": plenty, "quantity": 1})
+    await client.post("/cart/", headers=user, json={"product_id": cut, "quantity": 2})
+    await client.put(f"/admin/products/{cut}", headers=admin, json={
+        "name": "test product", "description": "d", "price": 10.0, "stock": 1, "category": "tests", "image_url": "u",
+    })
+    response = await client.post("/checkout/", headers=user, json=CHECKOUT)
+    assert response.status_code == 400
+    assert "Not enough stock" in response.json()["message"]
+    assert (stock_of(plenty), stock_of(cut)) == ((5, 1), (1, 2)) #nothing sold, the holds are still there
+    assert (await client.get("/orders/", headers=user)).json() == []
+
+
+async def test_concurrent_checkouts_never_oversell(client, new_user, new_product, stock_of):
+    product_id = await new_product(stock=3)
+    users = [await new_user() for _ in range(5)]
+    added = [
+        (await client.post("/cart/", headers=user, json={"product_id": product_id, "quantity": 1})).status_code
+        for user in users
+    ]
+    buyers = [user for user, code in zip(users, added) if code == 201]
+    responses = await asyncio.gather(*(client.post("/checkout/", headers=user, json=CHECKOUT) for user in buyers))
+    assert [response.status_code for response in responses].count(201) == 3
+    assert stock_of(product_id) == (0, 0)
+
+
+async def test_replayed_key_returns_the_first_order(client, new_user, new_product, stock_of):
+    product_id = await new_product(stock=5)
+    user = await new_user()
+    await client.post("/cart/", headers=user, json={"product_id": product_id, "quantity": 1})
+    headers = {**user, "Idempotency-Key": "replay"}
+    first = await client.post("/checkout/", headers=headers, json=CHECKOUT)
+    second = await client.post("/checkout/", headers=headers, json=CHECKOUT)
+    assert first.status_code == second.status_code == 201
+    assert second.json() == first.json()
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert stock_of(product_id) == (4, 0)
+    assert len((await client.get("/orders/", headers=user)).json()) == 1
+
+
+async def test_concurrent_duplicates_place_one_order(client, new_user, new_product, stock_of):
+    product_id = await new_product(stock=5)
+    user = await new_user()
+    await client.post("/cart/", headers=user, json={"product_id": product_id, "quantity": 1})
+    headers = {**user, "Idempotency-Key": "concurrent"}
+    responses = await asyncio.gather(*(client.post("/checkout/", headers=headers, json=CHECKOUT) for _ in range(3)))
+    assert {response.json()["order_id"] for response in responses} == {responses[0].json()["order_id"]}
+    assert stock_of(product_id) == (4, 0)
+
+
+async def test_key_reused_for_a_different_request_is_rejected(client, new_user, new_product):
+    product_id = await new_product(stock=5)
+    user = await new_user()
+    await client.post("/cart/", headers=user, json={"product_id": product_id, "quantity": 1})
+    headers = {**user, "Idempotency-Key": "mismatch"}
+    assert (await client.post("/checkout/", headers=headers, json={"status": "paid"})).status_code == 201
+    response = await client.post("/checkout/", headers=headers, json={"status": "pending"})
+    assert response.status_code == 422
+
+
+async def test_keys_are_scoped_per_user(client, new_user, new_product):
+    product_id = await new_product(stock=5)
+    first, second = await new_user(), await new_user()
+    for user in (first, second):
+        await client.post("/cart/", headers=user, json={"product_id": product_id, "quantity": 1})
+    orders = [
+        (await client.post("/checkout/", headers={**user, "Idempotency-Key": "shared"}, json=CHECKOUT)).json()["order_id"]
+        for user in (first, second)
+    ]
+    assert orders[0] != orders[1]
+
+
+async def test_client_error_is_replayed_not_retried(client, new_user, new_product, stock_of):
+    product_id = await new_product(stock=5)
+    user = await new_user()
+    headers = {**user, "Idempotency-Key": "empty-cart"}
+    first = await client.post("/checkout/", headers=headers, json=CHECKOUT)
+    assert first.status_code == 400
+    await client.post("/cart/", headers=user, json={"product_id": product_id, "quantity": 1})
+    second = await client.post("/checkout/", headers=headers, json=CHECKOUT)
+    assert second.status_code == 400
+    assert second.json() == first.json()
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert stock_of(product_id) == (5, 1) #the cart was not checked out
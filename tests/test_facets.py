@@ -0,0 +1,47 @@
+import pytest
+from app.core.config import settings
+from app.products import facets
+from app.products.facets import facet_aggregates
+
+pytestmark = pytest.mark.anyio
+
+
+async def _total(client) -> int:
+    response = await client.get("/products/facets")
+    assert response.status_code == 200, response.text
+    return response.json()["total"]
+
+
+async def test_refresh_of_many_dirty_ids(client, new_product):
+    before = await _total(client)
+    await new_product(stock=5)
+    facet_aggregates.mark_dirty(range(10**9, 10**9 + 40000)) #more ids than a statement may bind; none of them exists
+    assert await _total(client) == before + 1
+
+
+async def test_failed_refresh_keeps_the_ids_dirty(client, new_product, monkeypatch):
+    before = await _total(client)
+    await new_product(stock=5)
+    async def lost_connection(*args):
+        raise OSError("connection lost")
+    monkeypatch.setattr(facets, "select_by_ids", lost_connection)
+    with pytest.raises(OSError):
+        await facet_aggregates.unfiltered()
+    monkeypatch.undo()
+    assert await _total(client) == before + 1
+
+
+async def test_keyword_facets_count_every_match(client, admin, new_product, monkeypatch):
+    ids = [await new_product(stock=stock, price=price) for stock, price in ((5, 10.0), (0, 20.0), (5, 30.0))]
+    keyword = f"teapot{ids[0]}"
+    for product_id in ids:
+        product = (await client.get(f"/products/{product_id}")).json()
+        await client.put(f"/admin/products/{product_id}", headers=admin, json={
+            "name": f"{keyword} set", "description": "d", "price": product["price"], "stock": product["stock"],
+            "category": "tests", "image_url": "u",
+        })
+    monkeypatch.setattr(settings, "SEARCH_CONDITION_MAX_IDS", 1) #an IN list would count one product
+    facets = (await client.get("/products/facets", params={"keyword": keyword})).json()
+    assert (facets["total"], facets["in_stock"], facets["categories"]) == (3, 2, [{"category": "tests", "count": 3}])
+    facets = (await client.get("/products/facets", params={"keyword": keyword, "min_price": 15})).json()
+    assert (facets["total"], facets["in_stock"]) == (2, 1)
@@ -0,0 +1,16 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_pool_overflow_is_never_negative(client, admin):
+    pools = (await client.get("/admin/health/db-pool", headers=admin)).json()["pools"]
+    for stats in pools.values():
+        assert stats["overflow"] == max(stats["overflow_counter"], 0)
+    assert pools["sync"]["overflow_counter"] < 0 #the tests use the sync pool one connection at a time
+
+
+async def test_overflow_gauge_is_never_negative(client):
+    body = (await client.get("/metrics")).text
+    values = [float(line.rsplit(" ", 1)[1]) for line in body.splitlines() if line.startswith("db_pool_overflow{")]
+    assert values and min(values) >= 0
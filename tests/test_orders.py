@@ -0,0 +1,22 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def _order(client, user, product_id: int) -> int:
+    await client.post("/cart/", headers=user, json={"product_id": product_id, "quantity": 1})
+    response = await client.post("/checkout/", headers=user, json={"status": "paid"})
+    assert response.status_code == 201, response.text
+    return response.json()["order_id"]
+
+
+async def test_batch_details_embed_products_only_when_asked(client, new_user, new_product):
+    product_id = await new_product(stock=5)
+    user = await new_user()
+    first, second = await _order(client, user, product_id), await _order(client, user, product_id)
+    ids = f"{second},{first},{10**9}"
+    plain = (await client.get("/orders/details", headers=user, params={"ids": ids})).json()
+    assert [order["id"] for order in plain] == [second, first]
+    assert [item["product"] for order in plain for item in order["items"]] == [None, None]
+    embedded = (await client.get("/orders/details", headers=user, params={"ids": ids, "include_products": "true"})).json()
+    assert [item["product"]["name"] for order in embedded for item in order["items"]] == ["test product", "test product"]
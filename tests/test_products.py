@@ -0,0 +1,15 @@
+import pytest
+from app.core.replicas import read_router
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_only_conditional_gets_open_a_read_session(client, new_product):
+    product_id = await new_product(stock=5)
+    first = await client.get(f"/products/{product_id}") #fills the product cache
+    reads = read_router.primary_reads
+    assert (await client.get(f"/products/{product_id}")).status_code == 200
+    assert read_router.primary_reads == reads
+    response = await client.get(f"/products/{product_id}", headers={"If-None-Match": first.headers["ETag"]})
+    assert response.status_code == 304
+    assert read_router.primary_reads == reads + 1
@@ -0,0 +1,35 @@
+import pytest
+from app.products import search
+from app.products.search import search_index
+
+pytestmark = pytest.mark.anyio
+
+
+async def _rename(client, admin, product_id: int, name: str):
+    response = await client.put(f"/admin/products/{product_id}", headers=admin, json={
+        "name": name, "description": "d", "price": 10.0, "stock": 5, "category": "tests", "image_url": "u",
+    })
+    assert response.status_code == 200, response.text
+
+
+async def test_refresh_of_many_dirty_ids(client, admin, new_product):
+    product_id = await new_product(stock=5)
+    await client.get("/products/search", params={"keyword": "test"}) #the index is loaded
+    await _rename(client, admin, product_id, f"okapi{product_id}")
+    search_index.mark_dirty(range(10**9, 10**9 + 40000)) #more ids than a statement may bind; none of them exists
+    response = await client.get("/products/search", params={"keyword": f"okapi{product_id}"})
+    assert [product["id"] for product in response.json()] == [product_id]
+
+
+async def test_failed_refresh_keeps_the_ids_dirty(client, admin, new_product, monkeypatch):
+    product_id = await new_product(stock=5)
+    await client.get("/products/search", params={"keyword": "test"})
+    await _rename(client, admin, product_id, f"quokka{product_id}")
+    async def lost_connection(*args):
+        raise OSError("connection lost")
+    monkeypatch.setattr(search, "select_by_ids", lost_connection)
+    with pytest.raises(OSError):
+        await search_index.condition(None, f"quokka{product_id}")
+    monkeypatch.undo()
+    response = await client.get("/products/search", params={"keyword": f"quokka{product_id}"})
+    assert [product["id"] for product in response.json()] == [product_id]